@@ -0,0 +1,104 @@
+## cold-start benchmark of the plotting scripts, with python -X importtime
+## usage : python benchmarks/startup_benchmark.py [--repeat 5] [--top 5] [--csv startup.csv]
+##
+## AutoTRJ starts xpm_plot.py and rmsd_plot.py dozens of times per job, so the
+## interpreter + import cost of every start matters; matplotlib and scipy are
+## only imported by the paths that draw, -e / -g / --help should not pay for them
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+from synthetic_xpm import write_fel_xpm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> tuple:
+    """sum the self time of all imports and list the top level imports by cumulative time (us)"""
+
+    total, top_level = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        ## nested imports are indented below their parent
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative_us), name.strip()))
+    return total, sorted(top_level, reverse=True)
+
+
+def run_once(command: list, workdir: str) -> tuple:
+    """run one command with -X importtime, return wall time (s), import time (s) and top imports"""
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + command,
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise RuntimeError("failed : {}".format(" ".join(command)))
+    total, top_level = parse_importtime(result.stderr)
+    return wall, total / 1e6, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the cold start of xpm_plot.py and rmsd_plot.py")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each command, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="number of top level imports to list")
+    parser.add_argument("--csv", help="append the medians to this csv file, to track them over commits")
+    args = parser.parse_args()
+
+    xpm_plot = os.path.join(ROOT, "xpm_plot.py")
+    rmsd_plot = os.path.join(ROOT, "rmsd_plot.py")
+    with tempfile.TemporaryDirectory() as workdir:
+        write_fel_xpm(os.path.join(workdir, "gibbs.xpm"), 200, 200)
+        rmsd = np.abs(np.cumsum(np.random.default_rng(0).normal(0, 0.05, 1000))) + 1.0
+        with open(os.path.join(workdir, "rmsd.csv"), "w") as fo:
+            fo.write("frame,RMSD\n")
+            for i, value in enumerate(rmsd):
+                fo.write("{},{:.4f}\n".format(i, value))
+
+        ## the outputs get a new name in every run, the scripts refuse to overwrite
+        commands = [
+            ("xpm_plot.py --help", lambda i: [xpm_plot, "--help"]),
+            ("xpm_plot.py -e", lambda i: [xpm_plot, "-e", "gibbs.xpm", "-o", f"e{i}.csv"]),
+            ("xpm_plot.py -g", lambda i: [xpm_plot, "-g", "gibbs.xpm", "-o", f"g{i}.gpl"]),
+            ("rmsd_plot.py --help", lambda i: [rmsd_plot, "--help"]),
+            ("rmsd_plot.py -f", lambda i: [rmsd_plot, "-f", "rmsd.csv", "-o", f"r{i}"]),
+        ]
+        ## warm the file system cache, so the first command is not penalized
+        run_once([xpm_plot, "--help"], workdir)
+
+        records = []
+        for label, command in commands:
+            runs = [run_once(command(i), workdir) for i in range(args.repeat)]
+            wall = float(np.median([run[0] for run in runs]))
+            imports = float(np.median([run[1] for run in runs]))
+            records.append((label, wall, imports))
+            print("{:22s} wall {:7.3f} s   imports {:7.3f} s".format(label, wall, imports))
+            for cumulative, name in runs[-1][2][: args.top]:
+                print("    {:28s} {:8.1f} ms".format(name, cumulative / 1e3))
+
+    if args.csv != None:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, "a") as fo:
+            if new_file:
+                fo.write("date,command,wall_s,imports_s\n")
+            date = time.strftime("%Y-%m-%d %H:%M:%S")
+            for label, wall, imports in records:
+                fo.write("{},{},{:.4f},{:.4f}\n".format(date, label, wall, imports))
+
+
+if __name__ == "__main__":
+    main()
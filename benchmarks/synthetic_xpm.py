@@ -0,0 +1,68 @@
+## synthetic GROMACS-style xpm files for the xpm_plot.py benchmarks
+
+import os
+import sys
+import numpy as np
+
+## make xpm_plot.py (one directory up) importable from the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_fel_xpm(
+    outputfile: str, width: int, height: int, color_num: int = 100, seed: int = 0
+) -> None:
+    """write a Continuous xpm of a two-basin free energy landscape, like gmx sham
+    outputfile: the xpm file to write
+    width, height: the number of pixels
+    color_num: the number of colors (2 chars per pixel above 90 colors)
+    """
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-2.0, 2.0, width)
+    y = np.linspace(-1.5, 2.5, height)
+    xx, yy = np.meshgrid(x, y)
+    energy = -np.log(
+        np.exp(-2.0 * ((xx - 0.7) ** 2 + (yy - 0.5) ** 2))
+        + 0.6 * np.exp(-3.0 * ((xx + 0.8) ** 2 + (yy - 1.2) ** 2))
+        + 1e-3
+    )
+    energy += 0.05 * rng.normal(size=energy.shape)
+    energy -= energy.min()
+    levels = np.minimum((energy / energy.max() * color_num).astype(int), color_num - 1)
+
+    ## printable chars without " and \
+    alphabet = [chr(c) for c in range(35, 127) if chr(c) != "\\"]
+    char_per_pixel = 1 if color_num <= len(alphabet) else 2
+    if char_per_pixel == 1:
+        codes = alphabet[:color_num]
+    else:
+        codes = [a + b for a in alphabet for b in alphabet][:color_num]
+
+    lines = [
+        "/* XPM */",
+        '/* title:   "Gibbs Energy Landscape" */',
+        '/* legend:  "G (kJ/mol)" */',
+        '/* x-label: "PC1" */',
+        '/* y-label: "PC2" */',
+        '/* type:    "Continuous" */',
+        "static char *gromacs_xpm[] = {",
+        '"{} {}   {} {}",'.format(width, height, color_num, char_per_pixel),
+    ]
+    for i, code in enumerate(codes):
+        red = int(255 * i / max(color_num - 1, 1))
+        lines.append(
+            '"{}  c #{:02X}{:02X}FF " /* "{:.3g}" */,'.format(
+                code, red, red, energy.max() * i / color_num
+            )
+        )
+    ## gmx writes at most 80 axis values per comment line
+    for start in range(0, width, 80):
+        lines.append("/* x-axis:  {} */".format(" ".join("{:g}".format(v) for v in x[start : start + 80])))
+    for start in range(0, height, 80):
+        lines.append("/* y-axis:  {} */".format(" ".join("{:g}".format(v) for v in y[start : start + 80])))
+    ## the first pixel row is the top of the figure
+    for row in levels[::-1]:
+        lines.append('"{}",'.format("".join(codes[l] for l in row)))
+    lines.append("};")
+    with open(outputfile, "w") as fo:
+        fo.write("\n".join(lines) + "\n")
@@ -0,0 +1,89 @@
+## benchmark of the xpm_plot.py interpolation on a 200x200 FEL map
+## usage : python benchmarks/xpm_interpolation_benchmark.py [--size 200] [--factor 10 12]
+##
+## the old path was scipy.interpolate.interp2d(kind="linear"); it has been removed
+## from SciPy 1.14, where the same linear spline is RectBivariateSpline(kx=1, ky=1),
+## which is used as the old path when interp2d is not available
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from scipy.interpolate import RectBivariateSpline, RegularGridInterpolator
+
+from synthetic_xpm import write_fel_xpm
+import xpm_plot
+
+
+def legacy_interpolation(xaxis: list, yaxis: list, values: np.ndarray, factor: int) -> tuple:
+    """the former drawxpm_newIP / drawxpm_3D interpolation"""
+
+    x_new = np.linspace(np.min(xaxis), np.max(xaxis), factor * len(xaxis))
+    y_new = np.linspace(np.min(yaxis), np.max(yaxis), factor * len(yaxis))
+    try:
+        from scipy.interpolate import interp2d
+
+        ip_func = interp2d(xaxis, yaxis, values, kind="linear")
+        return "interp2d", ip_func(x_new, y_new)
+    except (ImportError, NotImplementedError):
+        ## interp2d sorted both axes before fitting
+        x_order, y_order = np.argsort(xaxis), np.argsort(yaxis)
+        spline = RectBivariateSpline(
+            np.asarray(yaxis)[y_order], np.asarray(xaxis)[x_order],
+            values[np.ix_(y_order, x_order)], kx=1, ky=1, s=0,
+        )
+        return "RectBivariateSpline(kx=1, ky=1)", spline(y_new, x_new)
+
+
+def grid_interpolator(xaxis: list, yaxis: list, values: np.ndarray, factor: int) -> np.ndarray:
+    """RegularGridInterpolator on the same grid, for reference"""
+
+    x_order, y_order = np.argsort(xaxis), np.argsort(yaxis)
+    x_sorted, y_sorted = np.asarray(xaxis)[x_order], np.asarray(yaxis)[y_order]
+    ip_func = RegularGridInterpolator((y_sorted, x_sorted), values[np.ix_(y_order, x_order)])
+    x_new = np.linspace(x_sorted[0], x_sorted[-1], factor * len(xaxis))
+    y_new = np.linspace(y_sorted[0], y_sorted[-1], factor * len(yaxis))
+    yy, xx = np.meshgrid(y_new, x_new, indexing="ij")
+    return ip_func(np.stack([yy.ravel(), xx.ravel()], axis=-1)).reshape(yy.shape)
+
+
+def timed(func, *args, repeat: int = 3) -> tuple:
+    """best wall time of repeat calls and the last result"""
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the interpolation of xpm_plot.py")
+    parser.add_argument("--size", type=int, default=200, help="width and height of the map")
+    parser.add_argument("--factor", type=int, nargs="+", default=[10, 12], help="upsampling factors")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        xpmfile = os.path.join(workdir, "gibbs.xpm")
+        write_fel_xpm(xpmfile, args.size, args.size)
+        xpm = xpm_plot.readxpm(xpmfile)
+        ## the same inputs as drawxpm_newIP and drawxpm_3D
+        xaxis, yaxis, values = xpm.xaxis, xpm.yaxis[::-1], xpm.values
+
+        for factor in args.factor:
+            legacy_time, (legacy_name, legacy) = timed(legacy_interpolation, xaxis, yaxis, values, factor)
+            rgi_time, rgi = timed(grid_interpolator, xaxis, yaxis, values, factor)
+            new_time, (_, _, new) = timed(xpm_plot.interpolate_grid, xaxis, yaxis, values, factor)
+            print("{}x{} map, factor {} -> {}x{} grid".format(
+                args.size, args.size, factor, new.shape[1], new.shape[0]))
+            print("  old path ({}) : {:8.3f} s".format(legacy_name, legacy_time))
+            print("  RegularGridInterpolator : {:8.3f} s, max |diff| to old {:.2e}".format(
+                rgi_time, np.abs(rgi - legacy).max()))
+            print("  interpolate_grid        : {:8.3f} s, max |diff| to old {:.2e} ({:.1f}x faster)".format(
+                new_time, np.abs(new - legacy).max(), legacy_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
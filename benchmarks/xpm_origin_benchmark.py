@@ -0,0 +1,89 @@
+## regression benchmark of drawxpm_origin smoothing on a 500x500 map
+## usage : python benchmarks/xpm_origin_benchmark.py [--size 500]
+##
+## the old renderer re-filtered the whole partial image after every row
+## (quadratic in height, and the top rows were smoothed up to height times);
+## origin_image() decodes the full image once and filters it once
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import scipy.ndimage as ndimage
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from synthetic_xpm import write_fel_xpm
+import xpm_plot
+
+
+def legacy_origin_image(xpm: xpm_plot.XpmMap, IP: bool) -> np.ndarray:
+    """the previous drawxpm_origin smoothing: filter the partial image after each row"""
+
+    rows = np.array(xpm.colors_rgb)[xpm.index] if IP == False else xpm.values
+    img = None
+    for line in rows:
+        img = line[np.newaxis] if img is None else np.concatenate([img, line[np.newaxis]])
+        img = ndimage.gaussian_filter(img, sigma=0.3)
+    return img
+
+
+def render(img: np.ndarray, IP: bool, outputpng: str) -> None:
+    """render an origin image like drawxpm_origin"""
+
+    plt.figure()
+    if IP == False:
+        plt.imshow(img, aspect="auto")
+    else:
+        plt.imshow(img, cmap="coolwarm", interpolation="bilinear", aspect="auto")
+    plt.savefig(outputpng, dpi=100)
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark drawxpm_origin smoothing")
+    parser.add_argument("--size", type=int, default=500, help="width and height of the map")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        xpmfile = os.path.join(workdir, "gibbs.xpm")
+        write_fel_xpm(xpmfile, args.size, args.size)
+        xpm = xpm_plot.readxpm(xpmfile)
+        xpm.index
+
+        for IP in (False, True):
+            start = time.perf_counter()
+            legacy = legacy_origin_image(xpm, IP)
+            legacy_smooth = time.perf_counter() - start
+            render(legacy, IP, os.path.join(workdir, "legacy.png"))
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            new = xpm_plot.origin_image(xpm, IP)
+            new_smooth = time.perf_counter() - start
+            render(new, IP, os.path.join(workdir, "new.png"))
+            new_time = time.perf_counter() - start
+
+            ## the new image must be the decoded map filtered exactly once
+            if IP == False:
+                reference = ndimage.gaussian_filter(
+                    np.array(xpm.colors_rgb, dtype=np.uint8)[xpm.index], sigma=(0.3, 0.3, 0)
+                )
+            else:
+                reference = ndimage.gaussian_filter(xpm.values, sigma=0.3)
+            diff = np.abs(legacy.astype(float) - new.astype(float))
+            print("{} map {}x{} ({})".format(
+                "rgb" if IP == False else "value", args.size, args.size, "IP" if IP else "no IP"))
+            print("  legacy : smoothing {:8.3f} s, with rendering {:8.3f} s".format(legacy_smooth, legacy_time))
+            print("  new    : smoothing {:8.3f} s, with rendering {:8.3f} s  ({:.0f}x / {:.1f}x faster)".format(
+                new_smooth, new_time, legacy_smooth / new_smooth, legacy_time / new_time))
+            print("  filtered once : {}".format(np.array_equal(new, reference)))
+            print("  legacy vs new : max |diff| {:.3f}, mean |diff| {:.4f}, top row mean |diff| {:.4f}".format(
+                diff.max(), diff.mean(), diff[0].mean()))
+
+
+if __name__ == "__main__":
+    main()
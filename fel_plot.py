@@ -0,0 +1,234 @@
+## free energy landscape (FEL) of two collective variables, in place of gmx sham
+## G = -kT ln(P / P_max) from a 2D histogram (or a gaussian KDE) of the frames,
+## drawn by xpm_plot.py straight from the array and also saved as a gmx style xpm
+## usage : python fel_plot.py -f PC12.csv -o job_gibbs [-c 1 2] [-b 32] [-t 310] [--kde]
+
+import os
+import argparse
+import numpy as np
+from xpm_plot import XpmMap, writexpm, plot_xpm
+
+## Boltzmann constant in kJ/(mol K), the unit of gmx sham
+BOLTZMANN = 0.0083144626
+
+
+def read_cv_data(inputfile: str, columns: list) -> np.ndarray:
+    """read two columns of collective variables from csv / xvg / space separated file
+    inputfile: the input file, xvg comments (# and @) and text header lines are skipped
+    columns: the indices (0-based) of the two columns, the first column is usually time
+    """
+
+    if not os.path.exists(inputfile):
+        print("ERROR -> {} not in current directory".format(inputfile))
+        exit()
+    rows, bad_rows = [], 0
+    with open(inputfile, "r") as fo:
+        for line in fo:
+            line = line.strip()
+            if line == "" or line[0] in "#@":
+                continue
+            items = line.split(",") if "," in line else line.split()
+            try:
+                rows.append([float(items[c]) for c in columns])
+            except (ValueError, IndexError):
+                bad_rows += 1
+    ## the header of csv is not counted as a bad row
+    if bad_rows > 1:
+        print("Warning -> {} lines of {} are not numbers and skipped".format(bad_rows, inputfile))
+    if len(rows) < 2:
+        print("ERROR -> less than 2 frames in {}".format(inputfile))
+        exit()
+    print("Info -> {} frames have been read from {}".format(len(rows), inputfile))
+    return np.array(rows)
+
+
+def free_energy(
+    cv: np.ndarray,
+    bins: list,
+    temperature: float = 310.0,
+    kde: bool = False,
+    bandwidth: float = None,
+) -> tuple:
+    """boltzmann inversion of the population of a (n_frames, 2) collective variable array
+    bins: number of bins along the two variables
+    temperature: temperature (K), G is in kJ/mol
+    kde: estimate the population by a gaussian KDE on the bin centers instead of counts
+    bandwidth: the bandwidth factor of the KDE (default: Scott's rule)
+    return: x centers, y centers, G as a (len(y), len(x)) matrix, the lowest G is 0
+    """
+
+    hist, xedges, yedges = np.histogram2d(cv[:, 0], cv[:, 1], bins=bins)
+    xcenters = (xedges[:-1] + xedges[1:]) / 2.0
+    ycenters = (yedges[:-1] + yedges[1:]) / 2.0
+    population = hist.T
+    visited = population > 0
+    if kde == True:
+        from scipy.stats import gaussian_kde
+
+        xgrid, ygrid = np.meshgrid(xcenters, ycenters)
+        density = gaussian_kde(cv.T, bw_method=bandwidth)
+        density = density(np.vstack([xgrid.ravel(), ygrid.ravel()])).reshape(xgrid.shape)
+        ## expected frames per bin; bins below one frame are unvisited, as in the histogram,
+        ## so the far tails of the KDE do not stretch the energy scale
+        population = density * len(cv) * np.diff(xedges)[0] * np.diff(yedges)[0]
+        visited = population >= 1.0
+        if not np.any(visited):
+            visited = population > 0
+
+    ## unvisited bins get the highest G of the visited ones, like gmx sham
+    energy = np.zeros(population.shape)
+    energy[visited] = -BOLTZMANN * temperature * np.log(population[visited] / population.max())
+    energy[~visited] = energy[visited].max()
+    return xcenters, ycenters, energy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw the free energy landscape of two collective variables")
+    parser.add_argument("-f", "--inputfile", required=True, help="csv or xvg file of the collective variables")
+    parser.add_argument("-o", "--outputfile", required=True, help="prefix of the xpm and the {prefix}_FEL folder")
+    parser.add_argument(
+        "-c",
+        "--columns",
+        type=int,
+        nargs=2,
+        default=[1, 2],
+        help="the two columns (0-based) of the collective variables (default: 1 2)",
+    )
+    parser.add_argument(
+        "-b",
+        "--bins",
+        type=int,
+        nargs="+",
+        default=[32],
+        help="number of bins, one for both variables or one for each (default: 32, as gmx sham -ngrid)",
+    )
+    parser.add_argument(
+        "-t",
+        "--temperature",
+        type=float,
+        default=310.0,
+        help="temperature (K) of the boltzmann inversion (default: 310)",
+    )
+    parser.add_argument(
+        "--kde",
+        action="store_true",
+        default=False,
+        help="estimate the population by a gaussian KDE instead of the histogram counts",
+    )
+    parser.add_argument(
+        "--kde-bandwidth",
+        type=float,
+        default=None,
+        help="bandwidth factor of the KDE (default: Scott's rule)",
+    )
+    parser.add_argument("-xl", "--xlabel", default="PC1", help="label of the first variable (default: PC1)")
+    parser.add_argument("-yl", "--ylabel", default="PC2", help="label of the second variable (default: PC2)")
+    parser.add_argument("--title", default="Gibbs Energy Landscape", help="title of the figures")
+    parser.add_argument(
+        "-n",
+        "--nlevels",
+        type=int,
+        default=100,
+        help="number of color levels of the xpm (default: 100, as gmx sham -nlevels)",
+    )
+    parser.add_argument(
+        "-ipf",
+        "--ip-factor",
+        type=int,
+        default=None,
+        help="upsampling factor of the interpolation (default: 10 for pcolormesh, 12 for 3D)",
+    )
+    parser.add_argument(
+        "-rot",
+        "--rotations",
+        type=int,
+        default=9,
+        help="number of 3D views, turning the azimuth from 0 to 360 degrees (default: 9)",
+    )
+    parser.add_argument(
+        "--rotation-dpi",
+        type=int,
+        default=600,
+        help="resolution of the 3D views (default: 600)",
+    )
+    parser.add_argument(
+        "--rotation-output",
+        choices=["png", "gif", "mp4", "sheet"],
+        default="png",
+        help="write the 3D views as one png each, an animated gif / mp4, or one contact sheet png",
+    )
+    parser.add_argument(
+        "-np",
+        "--nproc",
+        type=int,
+        default=1,
+        help="number of processes rendering the 3D views (default: 1)",
+    )
+    parser.add_argument(
+        "--no-3d",
+        action="store_true",
+        default=False,
+        help="do not draw the 3D figures",
+    )
+    args = parser.parse_args()
+
+    ## check parameters
+    if len(args.bins) > 2 or min(args.bins) < 2:
+        print("ERROR -> give one or two numbers of bins, at least 2")
+        exit()
+    if args.temperature <= 0:
+        print("ERROR -> the temperature should be positive")
+        exit()
+    if args.nlevels < 2:
+        print("ERROR -> the number of color levels should be at least 2")
+        exit()
+    if args.ip_factor != None and args.ip_factor < 1:
+        print("ERROR -> the interpolation factor should be a positive integer")
+        exit()
+    if args.rotations < 1 or args.rotation_dpi < 1 or args.nproc < 1:
+        print("ERROR -> rotations, rotation dpi and nproc should be positive integers")
+        exit()
+    outputxpm = f"{args.outputfile}.xpm"
+    ## the xpm is derived data, overwritten on a rerun as gmx sham does
+    if os.path.exists(outputxpm):
+        print("Info -> {} already in current directory, overwritten".format(outputxpm))
+
+    ## free energy landscape
+    cv = read_cv_data(args.inputfile, args.columns)
+    bins = args.bins[0] if len(args.bins) == 1 else args.bins
+    xcenters, ycenters, energy = free_energy(
+        cv, bins, args.temperature, args.kde, args.kde_bandwidth
+    )
+    xpm = XpmMap.from_values(
+        energy,
+        xcenters,
+        ycenters,
+        args.title,
+        "G (kJ/mol)",
+        args.xlabel,
+        args.ylabel,
+        color_num=args.nlevels,
+        path=outputxpm,
+    )
+    writexpm(xpm, outputxpm)
+    print("Info -> free energy landscape at {} K is saved into {}".format(args.temperature, outputxpm))
+    print("Info -> the highest free energy is {:.3f} kJ/mol".format(energy.max()))
+
+    ## draw from the array, the xpm is not read back
+    options = {
+        "ip": True,
+        "ip_factor": args.ip_factor,
+        "pcm": True,
+        "fig_3d": not args.no_3d,
+        "noshow": True,
+        "rotations": args.rotations,
+        "dpi": args.rotation_dpi,
+        "nproc": args.nproc,
+        "rotation_output": args.rotation_output,
+    }
+    plot_xpm(xpm, args.outputfile, options)
+    print("Good Day !")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,20 @@ This script performs comprehensive hydrogen bond analysis on MD trajectories,
 including occupancy, lifetime, and distance/angle distribution analysis.
 
 Usage:
-    $SCHRODINGER/run hbond_analysis.py <cms_file> <trajectory> <asl1> <asl2> <output_prefix>
+    $SCHRODINGER/run hbond_analysis.py <cms_file> <trajectory> <asl1> <asl2> <output_prefix> [--search kdtree] [--nproc N] [--stream] [--acf-lags N]
+        [--start N] [--end N] [--stride N] [--no-cache]
+        [--distance-cutoff A] [--angle-cutoff DEG] [--criteria DISTANCE:ANGLE [DISTANCE:ANGLE ...]]
+        [--water-bridges] [--water-asl ASL] [--stats-format json|csv|parquet]
 
 Features:
     - H-bond occupancy: percentage of frames each donor-acceptor pair forms H-bond
     - H-bond lifetime: average and maximum duration of each H-bond
+    - H-bond autocorrelation: continuous/intermittent C(t) and fitted relaxation times
     - Distance/angle distributions: histograms of D-A distance and D-H-A angle
+    - Multiple H-bond criteria evaluated in a single trajectory pass (--criteria)
+    - Water-bridged ASL1-water-ASL2 contacts: occupancy and lifetime per bridge (--water-bridges)
+    - One statistics record per H-bond pair with the run metadata, merged across jobs
+      by stats_merge.py (--stats-format)
 
 Author: AutoMD Development Team
 """
@@ -20,7 +28,12 @@ Author: AutoMD Development Team
 import sys
 import os
 import argparse
-from collections import defaultdict
+import hashlib
+import itertools
+import time
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Schrodinger imports
 try:
@@ -41,10 +54,25 @@ except ImportError:
     plt = None
     print("WARNING: matplotlib not available, plots will not be generated.")
 
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+from stats_merge import STATS_FORMATS, check_stats_format, run_metadata, stats_filename, write_records
+
 
 # H-bond geometric criteria
 HBOND_DISTANCE_CUTOFF = 3.5  # Angstrom (Donor-Acceptor distance)
 HBOND_ANGLE_CUTOFF = 120.0   # Degrees (D-H-A angle minimum)
+HBOND_BLOCK_SIZE = 1000000   # Candidate pairs evaluated per NumPy batch
+FRAME_CHUNK_SIZE = 100       # Frames per detection task (serial or worker process)
+PAIR_CODE_BASE = 1 << 32     # Encodes a (donor atom, acceptor atom) tuple as one int64
+PAIR_BATCH_ELEMENTS = 4000000  # Pair x frame presence elements unpacked at once for statistics
+HISTOGRAM_BINS = 50          # Bins of the distance/angle distributions
+HISTOGRAM_MIN_DISTANCE = 2.0 # Angstrom, lower edge of the distance distribution
+HBOND_INDEX_CACHE_VERSION = 1  # Bump when the cached index layout changes
+STREAM_ACF_LAGS = 1000       # Frames of autocorrelation lag kept in streaming mode
 
 
 class HydrogenBond:
@@ -63,8 +91,7 @@ class HydrogenBond:
     @property
     def key(self):
         """Unique identifier for this H-bond type."""
-        return (f"{self.donor_chain}:{self.donor_resname}{self.donor_resnum}:{self.donor.pdbname.strip()}-"
-                f"{self.acceptor_chain}:{self.acceptor_resname}{self.acceptor_resnum}:{self.acceptor.pdbname.strip()}")
+        return f"{atom_label(self.donor)}-{atom_label(self.acceptor)}"
     
     @property
     def residue_pair(self):
@@ -73,6 +100,282 @@ class HydrogenBond:
                 f"{self.acceptor_chain}:{self.acceptor_resname}{self.acceptor_resnum}")
 
 
+class RunningHistogram:
+    """Fixed-bin histogram filled incrementally, so raw values never have to be kept."""
+    def __init__(self, low, high, bins=HISTOGRAM_BINS):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+    
+    def add(self, values):
+        """Add values; values outside the range are counted in the first/last bin."""
+        values = np.asarray(values, dtype=np.float64)
+        bins = np.clip(np.searchsorted(self.edges, values, side='right') - 1, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.n += len(values)
+        self.total += values.sum()
+    
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+
+class HbondOccupancy:
+    """
+    Array-backed store of H-bond detections across a trajectory.
+    Every donor-acceptor atom pair gets an integer pair id when it is first seen;
+    presence is kept as a packed bitset (pair id x frame) and distances/angles as
+    float32 arrays, so no per-detection Python objects or string keys are created.
+    With keep_samples=False (streaming mode) nothing grows with the trajectory length:
+    per-pair mean/std are updated with Welford's algorithm, presence is kept for two
+    blocks of max_lag frames only, and every finished block updates the per-pair
+    lifetime counters and the autocorrelation sums for lags below max_lag.
+    """
+    def __init__(self, keep_samples=True, distance_range=None, angle_range=None, max_lag=STREAM_ACF_LAGS):
+        self.pair_donor = np.empty(0, dtype=np.int64)     # pair id -> donor atom index
+        self.pair_acceptor = np.empty(0, dtype=np.int64)  # pair id -> acceptor atom index
+        self.n_frames = 0
+        self.keep_samples = keep_samples
+        self.distance_hist = RunningHistogram(*(distance_range or (HISTOGRAM_MIN_DISTANCE, HBOND_DISTANCE_CUTOFF)))
+        self.angle_hist = RunningHistogram(*(angle_range or (HBOND_ANGLE_CUTOFF, 180.0)))
+        self._sorted_codes = np.empty(0, dtype=np.int64)
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._bits = np.zeros((0, 0), dtype=np.uint8)
+        self._ids, self._distances, self._angles = [], [], []
+        # Welford accumulators (streaming mode): count, mean and sum of squared deviations
+        self._count = np.zeros(0, dtype=np.int64)
+        self._moments = {name: (np.zeros(0), np.zeros(0)) for name in ('distance', 'angle')}
+        # Block accumulators (streaming mode): presence of the previous and current block,
+        # per-pair lifetime counters, run-length histogram and intermittent ACF sums
+        self.max_lag = max_lag
+        self._block = 0
+        self._finished = False
+        self._previous = np.zeros((0, max_lag), dtype=bool)
+        self._current = np.zeros((0, max_lag), dtype=bool)
+        self._lifetimes = np.zeros((5, 0), dtype=np.int64)  # present, events, total, max, open run
+        self._length_counts = np.zeros(max_lag + 1, dtype=np.int64)
+        self._long_runs = [0, 0]  # number and total length of runs longer than max_lag
+        self._intermittent = np.zeros(max_lag)
+    
+    @property
+    def n_pairs(self):
+        return len(self.pair_donor)
+    
+    def pair_ids(self, donors, acceptors):
+        """Look up the ids of donor-acceptor atom pairs, assigning new ids in order of first appearance."""
+        codes = donors * PAIR_CODE_BASE + acceptors
+        pos = np.searchsorted(self._sorted_codes, codes)
+        known = pos < len(self._sorted_codes)
+        known[known] = self._sorted_codes[pos[known]] == codes[known]
+        
+        if not known.all():
+            new_codes, first = np.unique(codes[~known], return_index=True)
+            new_codes = new_codes[np.argsort(first)]
+            self.pair_donor = np.concatenate([self.pair_donor, new_codes // PAIR_CODE_BASE])
+            self.pair_acceptor = np.concatenate([self.pair_acceptor, new_codes % PAIR_CODE_BASE])
+            all_codes = np.concatenate([self._sorted_codes, new_codes])
+            all_ids = np.concatenate([self._sorted_ids, np.arange(len(self._sorted_ids), len(all_codes))])
+            order = np.argsort(all_codes)
+            self._sorted_codes, self._sorted_ids = all_codes[order], all_ids[order]
+            pos = np.searchsorted(self._sorted_codes, codes)
+        
+        return self._sorted_ids[pos]
+    
+    def _grow(self, n_pairs, n_frames):
+        """Grow the bitset (by doubling) to hold at least n_pairs x n_frames bits."""
+        rows, cols = self._bits.shape
+        need_cols = (n_frames + 7) // 8
+        if n_pairs <= rows and need_cols <= cols:
+            return
+        bits = np.zeros((max(n_pairs, 2 * rows), max(need_cols, 2 * cols)), dtype=np.uint8)
+        bits[:rows, :cols] = self._bits
+        self._bits = bits
+    
+    def add_detections(self, frames, donors, acceptors, distances, angles):
+        """
+        Record a batch of detections given as parallel arrays (frame index, donor atom,
+        acceptor atom, distance, angle). A pair is counted once per frame; if several
+        hydrogens of one donor bind the same acceptor, the most linear one is kept.
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        if len(frames) == 0:
+            return
+        ids = self.pair_ids(np.asarray(donors, dtype=np.int64), np.asarray(acceptors, dtype=np.int64))
+        
+        order = np.lexsort((-np.asarray(angles), ids, frames))
+        duplicate = np.zeros(len(frames), dtype=bool)
+        duplicate[order[1:]] = (frames[order[1:]] == frames[order[:-1]]) & (ids[order[1:]] == ids[order[:-1]])
+        keep = ~duplicate
+        frames, ids = frames[keep], ids[keep]
+        
+        distances = np.asarray(distances, dtype=np.float32)[keep]
+        angles = np.asarray(angles, dtype=np.float32)[keep]
+        
+        self.n_frames = max(self.n_frames, int(frames.max()) + 1)
+        self.distance_hist.add(distances)
+        self.angle_hist.add(angles)
+        if self.keep_samples:
+            self._grow(self.n_pairs, self.n_frames)
+            np.bitwise_or.at(self._bits, (ids, frames >> 3), (0x80 >> (frames & 7)).astype(np.uint8))
+            self._ids.append(ids.astype(np.int32))
+            self._distances.append(distances)
+            self._angles.append(angles)
+        else:
+            self._welford_update(ids, distances, angles)
+            self._add_to_blocks(frames, ids)
+    
+    def _add_to_blocks(self, frames, ids):
+        """Set presence bits in the current block, finishing blocks as the frames pass them."""
+        if self._finished:
+            raise RuntimeError("detections added after the streaming statistics were finished")
+        grow = self.n_pairs - len(self._current)
+        if grow > 0:
+            rows = max(self.n_pairs, 2 * len(self._current))
+            for name in ('_previous', '_current'):
+                block = np.zeros((rows, self.max_lag), dtype=bool)
+                block[:len(getattr(self, name))] = getattr(self, name)
+                setattr(self, name, block)
+            lifetimes = np.zeros((5, rows), dtype=np.int64)
+            lifetimes[:, :self._lifetimes.shape[1]] = self._lifetimes
+            self._lifetimes = lifetimes
+        blocks = frames // self.max_lag
+        if blocks.min() < self._block:
+            raise ValueError("streaming detections must arrive in frame order")
+        for block in np.unique(blocks):
+            while self._block < block:
+                self._finish_block()
+            in_block = blocks == block
+            self._current[ids[in_block], frames[in_block] - block * self.max_lag] = True
+    
+    def _finish_block(self, last=False):
+        """
+        Fold the current block into the lifetime counters and the ACF sums, then make it
+        the previous block. Runs reaching the end of the block stay open unless last.
+        """
+        window = self.max_lag
+        previous, current = self._previous, self._current
+        active = np.flatnonzero(previous.any(axis=1) | current.any(axis=1))
+        if len(active):
+            # h(s) h(s + t) for s + t in this block and t < max_lag, so s is in this or the previous block
+            n_fft = 1 << (4 * window - 1).bit_length()
+            later = np.zeros((len(active), 2 * window))
+            later[:, window:] = current[active]
+            earlier = np.concatenate([previous[active], current[active]], axis=1).astype(np.float64)
+            product = np.fft.rfft(later, n_fft, axis=1) * np.conj(np.fft.rfft(earlier, n_fft, axis=1))
+            self._intermittent += np.rint(np.fft.irfft(product.sum(axis=0), n_fft)[:window])
+            
+            open_run = self._lifetimes[4]
+            block = current[active]
+            self._lifetimes[0, active] += block.sum(axis=1)
+            # Open runs of the previous block end if their pair is absent from the first frame
+            ended = active[(open_run[active] > 0) & ~block[:, 0]]
+            self._close_runs(ended, open_run[ended])
+            
+            padded = np.zeros((len(active), window + 2), dtype=np.int8)
+            padded[:, 1:-1] = block
+            edges = np.diff(padded, axis=1)
+            rows, starts = np.nonzero(edges == 1)
+            _, ends = np.nonzero(edges == -1)
+            rows, lengths = active[rows], ends - starts
+            lengths[starts == 0] += open_run[rows[starts == 0]]
+            open_run[active] = 0
+            reaching_end = (ends == window) & (not last)
+            open_run[rows[reaching_end]] = lengths[reaching_end]
+            self._close_runs(rows[~reaching_end], lengths[~reaching_end])
+        self._previous, self._current = current, previous
+        self._current[:] = False
+        self._block += 1
+    
+    def _close_runs(self, rows, lengths):
+        """Count finished runs (pair id, length in frames) in the lifetime counters and histogram."""
+        self._lifetimes[1] += np.bincount(rows, minlength=self._lifetimes.shape[1])
+        self._lifetimes[2] += np.bincount(rows, weights=lengths, minlength=self._lifetimes.shape[1]).astype(np.int64)
+        np.maximum.at(self._lifetimes[3], rows, lengths)
+        short = lengths <= self.max_lag
+        self._length_counts += np.bincount(lengths[short], minlength=self.max_lag + 1)
+        self._long_runs[0] += int((~short).sum())
+        self._long_runs[1] += int(lengths[~short].sum())
+    
+    def _finish_stream(self):
+        """Finish the last block once, closing all open runs."""
+        if not self._finished:
+            self._finish_block(last=True)
+            self._finished = True
+    
+    def stream_lifetimes(self):
+        """Per-pair (frames present, events, total lifetime, max lifetime) of streaming mode."""
+        self._finish_stream()
+        return tuple(counter[:self.n_pairs] for counter in self._lifetimes[:4])
+    
+    def stream_autocorrelation(self):
+        """
+        Intermittent sums over time origins of h(0) h(t), run-length histogram (lengths
+        up to max_lag) and [number, total length] of longer runs, of streaming mode.
+        """
+        self._finish_stream()
+        return self._intermittent, self._length_counts, self._long_runs
+    
+    def _welford_update(self, ids, distances, angles):
+        """Merge a batch into the per-pair running mean/M2 (Welford, batched form of Chan et al.)."""
+        n_pairs = self.n_pairs
+        grow = n_pairs - len(self._count)
+        self._count = np.concatenate([self._count, np.zeros(grow, dtype=np.int64)])
+        n_batch = np.bincount(ids, minlength=n_pairs)
+        n_total = self._count + n_batch
+        safe_total = np.maximum(n_total, 1)
+        for name, values in (('distance', distances), ('angle', angles)):
+            mean, m2 = (np.concatenate([moment, np.zeros(grow)]) for moment in self._moments[name])
+            batch_mean = np.bincount(ids, weights=values, minlength=n_pairs) / np.maximum(n_batch, 1)
+            batch_m2 = np.bincount(ids, weights=(values - batch_mean[ids])**2, minlength=n_pairs)
+            delta = batch_mean - mean
+            mean += delta * n_batch / safe_total
+            m2 += batch_m2 + delta**2 * self._count * n_batch / safe_total
+            self._moments[name] = (mean, m2)
+        self._count = n_total
+    
+    def geometry_statistics(self):
+        """Return per-pair (distance mean, distance std, angle mean, angle std) arrays."""
+        n_pairs = self.n_pairs
+        if not self.keep_samples:
+            stats = []
+            counts = np.maximum(self._count, 1)
+            for name in ('distance', 'angle'):
+                mean, m2 = self._moments[name]
+                stats += [mean, np.sqrt(m2 / counts)]
+            return tuple(stats)
+        
+        pair_ids, distances, angles = self.samples()
+        counts = np.maximum(np.bincount(pair_ids, minlength=n_pairs), 1)
+        stats = []
+        for values in (distances, angles):
+            mean = np.bincount(pair_ids, weights=values, minlength=n_pairs) / counts
+            std = np.sqrt(np.bincount(pair_ids, weights=(values - mean[pair_ids])**2, minlength=n_pairs) / counts)
+            stats += [mean, std]
+        return tuple(stats)
+    
+    def presence(self, pair_ids=None, n_frames=None):
+        """Boolean presence matrix (pair x frame) for the given pair ids (default: all pairs)."""
+        n_frames = self.n_frames if n_frames is None else n_frames
+        rows = np.arange(self.n_pairs) if pair_ids is None else pair_ids
+        packed = self._bits[rows, :(n_frames + 7) // 8]
+        return np.unpackbits(packed, axis=1, count=n_frames).astype(bool)
+    
+    def samples(self):
+        """Return (pair_ids, distances, angles) of all recorded detections."""
+        if not self._ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+        self._ids = [np.concatenate(self._ids)]
+        self._distances = [np.concatenate(self._distances)]
+        self._angles = [np.concatenate(self._angles)]
+        return self._ids[0], self._distances[0], self._angles[0]
+    
+    def labels(self, atom_labels, link='-'):
+        """Build the "donor-acceptor" label of every pair id from a dict atom index -> label."""
+        return [f"{atom_labels[donor]}{link}{atom_labels[acceptor]}"
+                for donor, acceptor in zip(self.pair_donor, self.pair_acceptor)]
+
+
 def calculate_distance(pos1, pos2):
     """Calculate Euclidean distance between two positions."""
     return np.sqrt(np.sum((np.array(pos1) - np.array(pos2))**2))
@@ -89,6 +392,27 @@ def calculate_angle(pos1, pos2, pos3):
     return np.degrees(np.arccos(cos_angle))
 
 
+def calculate_distances(pos1, pos2):
+    """Calculate row-wise Euclidean distances between two (N, 3) position arrays."""
+    return np.sqrt(np.sum((pos1 - pos2)**2, axis=1))
+
+
+def calculate_angles(pos1, pos2, pos3):
+    """Calculate row-wise angles (in degrees) for three (N, 3) position arrays (pos1-pos2-pos3)."""
+    v1 = pos1 - pos2
+    v2 = pos3 - pos2
+    
+    cos_angle = np.einsum('ij,ij->i', v1, v2) / (np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1))
+    cos_angle = np.clip(cos_angle, -1.0, 1.0)
+    
+    return np.degrees(np.arccos(cos_angle))
+
+
+def atom_label(atom):
+    """Label of an atom as used in H-bond keys, e.g. "A:ALA123:N"."""
+    return f"{atom.chain}:{atom.pdbres.strip()}{atom.resnum}:{atom.pdbname.strip()}"
+
+
 def get_potential_donors(st, asl):
     """
     Get potential H-bond donors (N-H, O-H) from structure based on ASL.
@@ -125,67 +449,134 @@ def get_potential_acceptors(st, asl):
     return acceptors
 
 
-def detect_hbonds_in_frame(st, donors, acceptors, frame_coords=None):
+def build_hbond_index(donors, acceptors, all_pairs=True):
     """
-    Detect hydrogen bonds in a single frame.
-    Returns list of (HydrogenBond, distance, angle) tuples.
+    Resolve donors and acceptors into the index arrays used by the vectorized engine.
+    With all_pairs, same-atom and same-residue combinations are masked out here once,
+    so every frame only evaluates valid candidate pairs (kept in donor-major order).
+    The KD-tree search does not need the full pair list and applies the same
+    exclusions to its candidates instead.
     """
-    hbonds = []
+    residue_ids = {}
+    donor_idx = np.array([donor.index - 1 for donor, _ in donors], dtype=np.int64)
+    hydrogen_idx = np.array([hydrogen.index - 1 for _, hydrogen in donors], dtype=np.int64)
+    acceptor_idx = np.array([acceptor.index - 1 for acceptor in acceptors], dtype=np.int64)
+    donor_res = np.array([residue_ids.setdefault((donor.chain, donor.resnum), len(residue_ids))
+                          for donor, _ in donors], dtype=np.int64)
+    acceptor_res = np.array([residue_ids.setdefault((acceptor.chain, acceptor.resnum), len(residue_ids))
+                             for acceptor in acceptors], dtype=np.int64)
     
-    for donor, hydrogen in donors:
-        donor_idx = donor.index - 1  # 0-based index
-        h_idx = hydrogen.index - 1
-        
-        if frame_coords is not None:
-            donor_pos = frame_coords[donor_idx]
-            h_pos = frame_coords[h_idx]
-        else:
-            donor_pos = [donor.x, donor.y, donor.z]
-            h_pos = [hydrogen.x, hydrogen.y, hydrogen.z]
-        
-        for acceptor in acceptors:
-            # Skip if donor and acceptor are the same atom or same residue
-            if donor.index == acceptor.index:
-                continue
-            if donor.resnum == acceptor.resnum and donor.chain == acceptor.chain:
-                continue
-            
-            acceptor_idx = acceptor.index - 1
-            
-            if frame_coords is not None:
-                acceptor_pos = frame_coords[acceptor_idx]
-            else:
-                acceptor_pos = [acceptor.x, acceptor.y, acceptor.z]
-            
-            # Check distance criterion (D-A distance)
-            da_distance = calculate_distance(donor_pos, acceptor_pos)
-            if da_distance > HBOND_DISTANCE_CUTOFF:
-                continue
-            
-            # Check angle criterion (D-H-A angle)
-            dha_angle = calculate_angle(donor_pos, h_pos, acceptor_pos)
-            if dha_angle < HBOND_ANGLE_CUTOFF:
-                continue
-            
-            # Valid H-bond found
-            hb = HydrogenBond(donor, hydrogen, acceptor)
-            hbonds.append((hb, da_distance, dha_angle))
+    hbond_index = {
+        'donor': donor_idx,
+        'hydrogen': hydrogen_idx,
+        'acceptor': acceptor_idx,
+        'donor_res': donor_res,
+        'acceptor_res': acceptor_res,
+        'donor_label': [atom_label(donor) for donor, _ in donors],
+        'acceptor_label': [atom_label(acceptor) for acceptor in acceptors],
+    }
+    if all_pairs:
+        mask_candidate_pairs(hbond_index)
     
-    return hbonds
+    return hbond_index
+
 
+def mask_candidate_pairs(hbond_index):
+    """Add the donor-major list of valid (non same-atom, non same-residue) pairs to hbond_index."""
+    valid = ((hbond_index['donor'][:, None] != hbond_index['acceptor'][None, :]) &
+             (hbond_index['donor_res'][:, None] != hbond_index['acceptor_res'][None, :]))
+    hbond_index['pair_donor'], hbond_index['pair_acceptor'] = np.nonzero(valid)
+    return hbond_index
 
-def analyze_trajectory(cms_file, trj_path, asl1, asl2, output_prefix):
+
+def hbond_index_cache_path(cms_file, asl1, asl2, water_asl=None):
     """
-    Main function to analyze hydrogen bonds across trajectory.
+    Return (path, digest) of the sidecar .npz cache for the donor/acceptor index arrays.
+    The digest covers the CMS file content, both ASL strings and the water ASL, if any.
+    """
+    digest = hashlib.sha256()
+    with open(cms_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(f"\0{HBOND_INDEX_CACHE_VERSION}\0{asl1}\0{asl2}".encode())
+    if water_asl is not None:
+        digest.update(f"\0{water_asl}".encode())
+    digest = digest.hexdigest()
+    return f"{os.path.splitext(cms_file)[0]}_hbond_{digest[:16]}.npz", digest
+
+
+def save_hbond_indices(path, digest, hbond_indices):
+    """
+    Write the index arrays and labels of all H-bond directions to a .npz sidecar file.
+    Returns False (after a warning) if the cache cannot be written, e.g. next to a
+    CMS file in a read-only directory; the analysis goes on without it.
+    """
+    arrays = {'digest': np.array(digest)}
+    for i, hbond_index in enumerate(hbond_indices):
+        for name in ('donor', 'hydrogen', 'acceptor', 'donor_res', 'acceptor_res'):
+            arrays[f"{i}_{name}"] = hbond_index[name]
+        for name in ('donor_label', 'acceptor_label'):
+            arrays[f"{i}_{name}"] = np.array(hbond_index[name], dtype=str)
+    # Write to a temporary file first so concurrent runs never read a partial cache
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: could not write H-bond index cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+    return True
+
+
+def load_hbond_indices(path, digest, n_directions=2):
+    """Load cached H-bond index arrays, or return None if the cache is missing or stale."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as cache:
+            if str(cache['digest']) != digest:
+                return None
+            hbond_indices = []
+            for i in range(n_directions):
+                hbond_index = {name: cache[f"{i}_{name}"] for name in
+                               ('donor', 'hydrogen', 'acceptor', 'donor_res', 'acceptor_res')}
+                for name in ('donor_label', 'acceptor_label'):
+                    hbond_index[name] = cache[f"{i}_{name}"].tolist()
+                hbond_indices.append(hbond_index)
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile) as e:
+        # A half-written or stale cache is resolved again from the CMS file
+        print(f"WARNING: ignoring unreadable H-bond index cache {path}: {e}")
+        return None
+    return hbond_indices
+
+
+def resolve_hbond_indices(cms_file, asl1, asl2, all_pairs=True, use_cache=True, water_asl=None):
+    """
+    Resolve the donor/H/acceptor index arrays for ASL1 -> ASL2 and ASL2 -> ASL1 H-bonds.
+    With water_asl, four water link indices follow for bridge detection:
+    ASL1 donors -> water, water -> ASL1 acceptors, ASL2 donors -> water, water -> ASL2 acceptors.
+    The ASL evaluation and bonded-atom walk are cached in a sidecar .npz next to the
+    CMS file, so later runs on the same system skip topo.read_cms altogether.
     """
+    n_directions = 2 if water_asl is None else 6
+    if use_cache:
+        cache_path, digest = hbond_index_cache_path(cms_file, asl1, asl2, water_asl)
+        hbond_indices = load_hbond_indices(cache_path, digest, n_directions)
+        if hbond_indices is not None:
+            print(f"Loaded donor/acceptor index from cache: {cache_path}")
+            if all_pairs:
+                for hbond_index in hbond_indices[:2]:
+                    mask_candidate_pairs(hbond_index)
+            return hbond_indices
+    
     print(f"Loading system from: {cms_file}")
     msys_model, cms_model = topo.read_cms(cms_file)
     
-    print(f"Loading trajectory from: {trj_path}")
-    trj_frames = traj.read_traj(trj_path)
-    n_frames = len(trj_frames)
-    print(f"Total frames: {n_frames}")
-    
     # Get full system structure
     st = cms_model.fsys_ct
     
@@ -198,99 +589,646 @@ def analyze_trajectory(cms_file, trj_path, asl1, asl2, output_prefix):
     donors_2 = get_potential_donors(st, asl2)
     acceptors_2 = get_potential_acceptors(st, asl2)
     
-    print(f"ASL1: {len(donors_1)} potential donors, {len(acceptors_1)} potential acceptors")
-    print(f"ASL2: {len(donors_2)} potential donors, {len(acceptors_2)} potential acceptors")
+    # Precompute index arrays: ASL1 donors -> ASL2 acceptors, ASL2 donors -> ASL1 acceptors
+    hbond_indices = [build_hbond_index(donors_1, acceptors_2, all_pairs),
+                     build_hbond_index(donors_2, acceptors_1, all_pairs)]
     
-    # Data storage
-    hbond_frames = defaultdict(list)  # hbond_key -> list of frame indices
-    all_distances = defaultdict(list)  # hbond_key -> list of distances
-    all_angles = defaultdict(list)     # hbond_key -> list of angles
-    global_distances = []  # All H-bond distances
-    global_angles = []     # All H-bond angles
+    if water_asl is not None:
+        # Waters that are part of either selection are not bridging waters
+        water_asl = f"({water_asl}) and not (({asl1}) or ({asl2}))"
+        print(f"Finding bridging water donors/acceptors: {water_asl}")
+        water_donors = get_potential_donors(st, water_asl)
+        water_acceptors = get_potential_acceptors(st, water_asl)
+        print(f"Water: {len(water_acceptors)} potential acceptors, {len(water_donors)} O-H donors")
+        # Water links are only evaluated on KD-tree candidates, so no all-pairs list is built
+        hbond_indices += [build_hbond_index(donors_1, water_acceptors, all_pairs=False),
+                          build_hbond_index(water_donors, acceptors_1, all_pairs=False),
+                          build_hbond_index(donors_2, water_acceptors, all_pairs=False),
+                          build_hbond_index(water_donors, acceptors_2, all_pairs=False)]
     
-    print("\nAnalyzing frames...")
-    for frame_idx, frame in enumerate(trj_frames):
-        if frame_idx % 100 == 0:
-            print(f"  Processing frame {frame_idx}/{n_frames}...")
-        
-        coords = frame.pos()
-        
-        # Detect H-bonds: ASL1 donors -> ASL2 acceptors
-        hbonds_1to2 = detect_hbonds_in_frame(st, donors_1, acceptors_2, coords)
+    if use_cache and save_hbond_indices(cache_path, digest, hbond_indices):
+        print(f"Saved donor/acceptor index cache: {cache_path}")
+    return hbond_indices
+
+
+def frame_box(frame):
+    """Return the (3, 3) periodic box of a frame (rows are box vectors), or None if not periodic."""
+    box = getattr(frame, 'box', None)
+    if box is None:
+        return None
+    box = np.asarray(box, dtype=np.float64).reshape(3, 3)
+    if np.abs(np.linalg.det(box)) < 1e-6:
+        return None
+    return box
+
+
+def minimum_image(vectors, box):
+    """Wrap (N, 3) difference vectors to their minimum image in a (triclinic) periodic box."""
+    frac = vectors @ np.linalg.inv(box)
+    frac -= np.round(frac)
+    return (frac @ box).astype(vectors.dtype)
+
+
+def neighbor_pairs(donor_pos, acceptor_pos, cutoff, box=None):
+    """
+    Find all (donor, acceptor) position pairs within cutoff using a KD-tree over the acceptors.
+    For orthorhombic boxes the tree is built with periodic boundaries; for triclinic
+    boxes the acceptors are replicated into the 26 neighbouring images. Pairs across
+    the box boundary are therefore kept.
+    Returns unique (donors, acceptors) row indices sorted in donor-major order.
+    """
+    if cKDTree is None:
+        print("ERROR: scipy.spatial is required for the KD-tree neighbor search.")
+        sys.exit(1)
+    
+    donor_pos = np.asarray(donor_pos, dtype=np.float64)
+    acceptor_pos = np.asarray(acceptor_pos, dtype=np.float64)
+    n_acceptors = len(acceptor_pos)
+    if len(donor_pos) == 0 or n_acceptors == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    
+    # Small skin so that float32 round-off at the cutoff is decided by the exact criterion
+    radius = cutoff + 1e-3
+    if box is None:
+        tree = cKDTree(acceptor_pos)
+    elif np.allclose(box, np.diag(np.diag(box))):
+        lengths = np.diag(box)
+        donor_pos = donor_pos - np.floor(donor_pos / lengths) * lengths
+        acceptor_pos = acceptor_pos - np.floor(acceptor_pos / lengths) * lengths
+        # Guard against round-off placing a coordinate exactly on the upper box face
+        donor_pos[donor_pos >= lengths] = 0.0
+        acceptor_pos[acceptor_pos >= lengths] = 0.0
+        tree = cKDTree(acceptor_pos, boxsize=lengths)
+    else:
+        inverse = np.linalg.inv(box)
+        donor_pos = (donor_pos @ inverse % 1.0) @ box
+        acceptor_pos = (acceptor_pos @ inverse % 1.0) @ box
+        shifts = np.array([[i, j, k] for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]) @ box
+        tree = cKDTree((acceptor_pos[None, :, :] + shifts[:, None, :]).reshape(-1, 3))
+    
+    neighbors = tree.query_ball_point(donor_pos, r=radius)
+    counts = np.fromiter((len(n) for n in neighbors), dtype=np.int64, count=len(neighbors))
+    donors = np.repeat(np.arange(len(neighbors), dtype=np.int64), counts)
+    acceptors = np.fromiter(itertools.chain.from_iterable(neighbors), dtype=np.int64,
+                            count=int(counts.sum())) % n_acceptors
+    
+    # Triclinic images can report the same acceptor twice; keep one donor-major ordered copy
+    codes = np.unique(donors * n_acceptors + acceptors)
+    return codes // n_acceptors, codes % n_acceptors
+
+
+def find_candidate_pairs(coords, hbond_index, cutoff, box=None):
+    """
+    Find donor-acceptor pairs within cutoff with neighbor_pairs (periodic KD-tree).
+    Same-atom and same-residue pairs are removed.
+    Returns (donors, acceptors) positions into hbond_index['donor'] / ['acceptor'],
+    sorted in the same donor-major order as the all-pairs engine.
+    """
+    donors, acceptors = neighbor_pairs(coords[hbond_index['donor']], coords[hbond_index['acceptor']],
+                                       cutoff, box)
+    valid = ((hbond_index['donor'][donors] != hbond_index['acceptor'][acceptors]) &
+             (hbond_index['donor_res'][donors] != hbond_index['acceptor_res'][acceptors]))
+    return donors[valid], acceptors[valid]
+
+
+def detect_hbonds_vectorized(coords, hbond_index, pairs=None, box=None, block_size=HBOND_BLOCK_SIZE,
+                             distance_cutoff=HBOND_DISTANCE_CUTOFF, angle_cutoff=HBOND_ANGLE_CUTOFF):
+    """
+    Detect hydrogen bonds for all candidate pairs of one frame with batched NumPy.
+    coords is the (n_atoms, 3) array from frame.pos(). pairs is an optional
+    (donors, acceptors) tuple from find_candidate_pairs; by default all precomputed
+    pairs of hbond_index are evaluated, in blocks of block_size to bound memory.
+    If box is given, D-A and D-H vectors use the minimum image convention.
+    A pair is an H-bond if D-A <= distance_cutoff and D-H-A >= angle_cutoff.
+    Returns (donors, acceptors, distances, angles), where donors and acceptors are
+    positions into hbond_index['donor'] and hbond_index['acceptor'].
+    """
+    if pairs is None:
+        pairs = (hbond_index['pair_donor'], hbond_index['pair_acceptor'])
+    pair_donor, pair_acceptor = pairs
+    
+    found_donors, found_acceptors, found_distances, found_angles = [], [], [], []
+    for start in range(0, len(pair_donor), block_size):
+        donors = pair_donor[start:start + block_size]
+        acceptors = pair_acceptor[start:start + block_size]
+        donor_pos = coords[hbond_index['donor'][donors]]
+        acceptor_pos = coords[hbond_index['acceptor'][acceptors]]
+        if box is not None:
+            acceptor_pos = donor_pos + minimum_image(acceptor_pos - donor_pos, box)
         
-        # Detect H-bonds: ASL2 donors -> ASL1 acceptors
-        hbonds_2to1 = detect_hbonds_in_frame(st, donors_2, acceptors_1, coords)
+        # Check distance criterion (D-A distance)
+        distances = calculate_distances(donor_pos, acceptor_pos)
+        close = np.nonzero(distances <= distance_cutoff)[0]
+        if len(close) == 0:
+            continue
         
-        # Combine results
-        all_hbonds = hbonds_1to2 + hbonds_2to1
+        # Check angle criterion (D-H-A angle), only for pairs within the distance cutoff
+        donor_pos = donor_pos[close]
+        h_pos = coords[hbond_index['hydrogen'][donors[close]]]
+        if box is not None:
+            h_pos = donor_pos + minimum_image(h_pos - donor_pos, box)
+        angles = calculate_angles(donor_pos, h_pos, acceptor_pos[close])
+        linear = angles >= angle_cutoff
         
-        for hb, dist, angle in all_hbonds:
-            key = hb.key
-            hbond_frames[key].append(frame_idx)
-            all_distances[key].append(dist)
-            all_angles[key].append(angle)
-            global_distances.append(dist)
-            global_angles.append(angle)
+        found_donors.append(donors[close[linear]])
+        found_acceptors.append(acceptors[close[linear]])
+        found_distances.append(distances[close[linear]])
+        found_angles.append(angles[linear])
+    
+    if not found_donors:
+        empty_idx, empty_val = np.empty(0, dtype=np.int64), np.empty(0, dtype=coords.dtype)
+        return empty_idx, empty_idx, empty_val, empty_val
+    return (np.concatenate(found_donors), np.concatenate(found_acceptors),
+            np.concatenate(found_distances), np.concatenate(found_angles))
+
+
+def detect_hbonds_in_frame(st, donors, acceptors, frame_coords=None):
+    """
+    Detect hydrogen bonds in a single frame.
+    Returns list of (HydrogenBond, distance, angle) tuples.
+    """
+    hbond_index = build_hbond_index(donors, acceptors)
+    coords = np.asarray(frame_coords) if frame_coords is not None else st.getXYZ()
+    
+    hbonds = []
+    for donor_pos, acceptor_pos, da_distance, dha_angle in zip(*detect_hbonds_vectorized(coords, hbond_index)):
+        donor, hydrogen = donors[donor_pos]
+        hbonds.append((HydrogenBond(donor, hydrogen, acceptors[acceptor_pos]), da_distance, dha_angle))
+    
+    return hbonds
+
+
+def build_bridge_index(link_indices, criterion=(HBOND_DISTANCE_CUTOFF, HBOND_ANGLE_CUTOFF)):
+    """
+    Bundle the four (localized) water link indices from resolve_hbond_indices for
+    detect_water_bridges, with the water oxygens and polar atoms of both selections.
+    """
+    to_water_1, from_water_1, to_water_2, from_water_2 = link_indices
+    return {
+        'links': link_indices,
+        'water': np.unique(np.concatenate([to_water_1['acceptor'], from_water_1['donor']])),
+        'polar': [np.unique(np.concatenate([to_water['donor'], from_water['acceptor']]))
+                  for to_water, from_water in ((to_water_1, from_water_1), (to_water_2, from_water_2))],
+        'criterion': criterion,
+    }
+
+
+def detect_water_bridges(coords, bridge_index, box=None):
+    """
+    Detect ASL1-water-ASL2 bridges in one frame: a water H-bonded (as donor or acceptor)
+    to an ASL1 atom and to an ASL2 atom at the same time.
+    A single KD-tree over the water oxygens is queried with the polar atoms of both
+    selections, and only the waters within the cutoff of both are passed to the H-bond
+    engine, so the cost scales with the first solvation shell, not with the box.
+    Returns (atoms_1, atoms_2, distances, angles): the bridged ASL1/ASL2 atoms, their
+    (minimum image) distance and the ASL1 atom-O(water)-ASL2 atom angle.
+    """
+    distance_cutoff, angle_cutoff = bridge_index['criterion']
+    water = bridge_index['water']
+    polar_1, polar_2 = bridge_index['polar']
+    empty_idx, empty_val = np.empty(0, dtype=np.int64), np.empty(0, dtype=coords.dtype)
+    empty = (empty_idx, empty_idx, empty_val, empty_val)
+    if len(water) == 0 or len(polar_1) == 0 or len(polar_2) == 0:
+        return empty
+    
+    # Waters within the D-A cutoff of both selections
+    query, target = neighbor_pairs(coords[np.concatenate([polar_1, polar_2])], coords[water],
+                                   distance_cutoff, box)
+    near_1 = np.unique(target[query < len(polar_1)])
+    near_2 = np.unique(target[query >= len(polar_1)])
+    near = water[np.intersect1d(near_1, near_2, assume_unique=True)]
+    if len(near) == 0:
+        return empty
+    
+    # H-bonds between each selection and the near waters, as (solute atom, water oxygen)
+    links = []
+    for i, link_index in enumerate(bridge_index['links']):
+        water_is_acceptor = i % 2 == 0
+        water_side = ('acceptor', 'acceptor_res') if water_is_acceptor else ('donor', 'hydrogen', 'donor_res')
+        rows = np.nonzero(np.isin(link_index[water_side[0]], near))[0]
+        sub_index = dict(link_index)
+        for name in water_side:
+            sub_index[name] = link_index[name][rows]
+        pairs = find_candidate_pairs(coords, sub_index, distance_cutoff, box)
+        donors, acceptors, _, _ = detect_hbonds_vectorized(coords, sub_index, pairs, box,
+                                                           distance_cutoff=distance_cutoff,
+                                                           angle_cutoff=angle_cutoff)
+        if water_is_acceptor:
+            links.append((sub_index['donor'][donors], sub_index['acceptor'][acceptors]))
+        else:
+            links.append((sub_index['acceptor'][acceptors], sub_index['donor'][donors]))
+    solute_1, water_1 = (np.concatenate(column) for column in zip(*links[:2]))
+    solute_2, water_2 = (np.concatenate(column) for column in zip(*links[2:]))
     
-    print(f"\nFound {len(hbond_frames)} unique H-bond types")
+    # Join both link lists on the water oxygen
+    order = np.argsort(water_2, kind='stable')
+    low = np.searchsorted(water_2[order], water_1, side='left')
+    counts = np.searchsorted(water_2[order], water_1, side='right') - low
+    first = np.repeat(np.arange(len(water_1)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = order[np.repeat(low, counts) + offsets]
+    atoms_1, atoms_2, bridge_water = solute_1[first], solute_2[second], water_1[first]
+    keep = atoms_1 != atoms_2
+    atoms_1, atoms_2, bridge_water = atoms_1[keep], atoms_2[keep], bridge_water[keep]
+    if len(atoms_1) == 0:
+        return empty
+    
+    water_pos = coords[bridge_water]
+    vector_1 = coords[atoms_1] - water_pos
+    vector_2 = coords[atoms_2] - water_pos
+    if box is not None:
+        vector_1, vector_2 = minimum_image(vector_1, box), minimum_image(vector_2, box)
+    distances = calculate_distances(vector_1, vector_2)
+    angles = calculate_angles(water_pos + vector_1, water_pos, water_pos + vector_2)
+    return atoms_1, atoms_2, distances, angles
+
+
+def localize_hbond_indices(hbond_indices):
+    """
+    Restrict the index arrays to the atoms taking part in H-bond detection.
+    Returns (atoms, local_indices): atoms are the atom indices to slice from frame.pos(),
+    local_indices are copies of hbond_indices renumbered into that slice, without the
+    labels, so they are cheap to send to worker processes.
+    """
+    atoms = np.unique(np.concatenate([hbond_index[name] for hbond_index in hbond_indices
+                                      for name in ('donor', 'hydrogen', 'acceptor')]))
+    local_indices = []
+    for hbond_index in hbond_indices:
+        local_index = {name: value for name, value in hbond_index.items() if not name.endswith('_label')}
+        for name in ('donor', 'hydrogen', 'acceptor'):
+            local_index[name] = np.searchsorted(atoms, hbond_index[name])
+        local_indices.append(local_index)
+    return atoms, local_indices
+
+
+def select_frames(trj_frames, start=0, end=None, stride=1):
+    """
+    Apply a START:END:STRIDE slice to a frame list or lazy frame iterator.
+    Only frame handles are skipped, so no coordinates are decoded for dropped frames.
+    """
+    if isinstance(trj_frames, list):
+        return trj_frames[start:end:stride]
+    if start < 0 or (end is not None and end < 0):
+        print("ERROR: Negative --start/--end are not supported in streaming mode.")
+        sys.exit(1)
+    return itertools.islice(trj_frames, start, end, stride)
+
+
+def read_frame_chunks(trj_frames, atoms, chunk_size=FRAME_CHUNK_SIZE, read_box=False, frame_times=None):
+    """
+    Yield (first_frame, coords, boxes) for consecutive chunks of frames.
+    coords is a (n_chunk, n_atoms, 3) array holding only the selected atoms;
+    boxes is a list of periodic boxes (or None when read_box is False).
+    If frame_times is a list, the times (ps) of the first two frames are appended to it.
+    """
+    frame_iter = iter(trj_frames)
+    first_frame = 0
+    while True:
+        frames = list(itertools.islice(frame_iter, chunk_size))
+        if not frames:
+            break
+        if frame_times is not None and len(frame_times) < 2:
+            frame_times.extend(frame.time for frame in frames[:2 - len(frame_times)])
+        coords = np.stack([frame.pos()[atoms] for frame in frames])
+        boxes = [frame_box(frame) for frame in frames] if read_box else None
+        yield first_frame, coords, boxes
+        first_frame += len(frames)
+
+
+def detect_hbonds_in_chunk(first_frame, coords, boxes, hbond_indices, search='all',
+                           criterion=(HBOND_DISTANCE_CUTOFF, HBOND_ANGLE_CUTOFF), bridge_index=None):
+    """
+    Detect H-bonds in a chunk of frames from plain coordinate and index arrays.
+    Used by both the serial path and the worker processes, so results are identical.
+    criterion is the (distance, angle) cutoff pair; for a multi-criteria run this is
+    the loosest combination, and the stricter criteria are filtered from its output.
+    Returns (first_frame, detections, bridges, pid, elapsed), where detections holds, for
+    every frame, one (donors, acceptors, distances, angles) tuple per H-bond index, and
+    bridges one detect_water_bridges tuple per frame (None without bridge_index).
+    """
+    start_time = time.perf_counter()
+    detections = []
+    bridges = [] if bridge_index is not None else None
+    for i, frame_coords in enumerate(coords):
+        box = boxes[i] if boxes is not None else None
+        frame_hbonds = []
+        for hbond_index in hbond_indices:
+            pairs = None
+            if search == 'kdtree':
+                pairs = find_candidate_pairs(frame_coords, hbond_index, criterion[0], box)
+            frame_hbonds.append(detect_hbonds_vectorized(frame_coords, hbond_index, pairs, box,
+                                                         distance_cutoff=criterion[0],
+                                                         angle_cutoff=criterion[1]))
+        detections.append(frame_hbonds)
+        if bridge_index is not None:
+            bridges.append(detect_water_bridges(frame_coords, bridge_index, box))
+    return first_frame, detections, bridges, os.getpid(), time.perf_counter() - start_time
+
+
+_worker_args = ()
+
+
+def _init_worker(hbond_indices, search, criterion, bridge_index):
+    """Store the index arrays once per worker process instead of sending them with every chunk."""
+    global _worker_args
+    _worker_args = (hbond_indices, search, criterion, bridge_index)
+
+
+def _detect_hbonds_worker(first_frame, coords, boxes):
+    return detect_hbonds_in_chunk(first_frame, coords, boxes, *_worker_args)
+
+
+def iterate_detections(chunks, hbond_indices, search='all', nproc=1,
+                       criterion=(HBOND_DISTANCE_CUTOFF, HBOND_ANGLE_CUTOFF), bridge_index=None):
+    """
+    Run detect_hbonds_in_chunk over frame chunks and yield the results in frame order.
+    With nproc > 1 the chunks are processed by a ProcessPoolExecutor; at most
+    2 * nproc chunks are in flight so memory stays bounded.
+    """
+    if nproc <= 1:
+        for first_frame, coords, boxes in chunks:
+            yield detect_hbonds_in_chunk(first_frame, coords, boxes, hbond_indices, search, criterion,
+                                         bridge_index)
+        return
+    
+    with ProcessPoolExecutor(max_workers=nproc, initializer=_init_worker,
+                             initargs=(hbond_indices, search, criterion, bridge_index)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_detect_hbonds_worker, *chunk))
+            if len(pending) >= 2 * nproc:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def report_worker_throughput(worker_stats):
+    """Print frames processed and frames per second for every worker process."""
+    print("\nWorker throughput:")
+    for pid, (n_done, elapsed) in sorted(worker_stats.items()):
+        fps = n_done / elapsed if elapsed > 0 else float('inf')
+        print(f"  Worker {pid}: {n_done} frames in {elapsed:.2f} s ({fps:.1f} frames/s)")
+
+
+def open_trajectory(trj_path, stream=False):
+    """
+    Open a trajectory as a list of frames, or as a lazy frame iterator when streaming,
+    so that frames are only decoded when their chunk is processed.
+    """
+    if stream:
+        try:
+            return traj.read_traj(trj_path, return_iter=True)
+        except TypeError:
+            print("WARNING: lazy trajectory iteration not supported by this release, reading frame list.")
+    return traj.read_traj(trj_path)
+
+
+def analyze_trajectory(cms_file, trj_path, asl1, asl2, output_prefix, search='all', nproc=1,
+                       stream=False, chunk_size=FRAME_CHUNK_SIZE, start=0, end=None, stride=1,
+                       use_cache=True, criteria=None, water_asl=None, stats_format=None,
+                       acf_lags=STREAM_ACF_LAGS):
+    """
+    Main function to analyze hydrogen bonds across trajectory.
+    search: 'all' evaluates every donor-acceptor pair, 'kdtree' only the pairs found
+            within the distance cutoff by a periodic KD-tree neighbor search. Both
+            use the minimum image in periodic boxes and give the same H-bonds.
+    nproc: number of worker processes for frame-parallel detection.
+    stream: consume frames lazily in chunks of chunk_size and keep running statistics
+            only, so memory does not grow with the trajectory length.
+    acf_lags: lags (frames) of the autocorrelation functions in streaming mode.
+    start, end, stride: frame slice applied before any coordinates are decoded.
+    use_cache: reuse/store the donor/acceptor index in a sidecar .npz next to the CMS file.
+    criteria: list of (distance, angle) cutoffs evaluated in the same pass over the
+              trajectory (default: the module cutoffs). With more than one criterion
+              every criterion writes its own outputs to criterion_prefix(), and the
+              list of per-criterion results is returned.
+    water_asl: also detect ASL1-water-ASL2 bridges (first criterion) and write them
+               to <output_prefix>_water_bridge_*.
+    stats_format: also write one record per pair to <prefix>_statistics.<stats_format>.
+    """
+    start_time = time.perf_counter()
+    criteria = criteria or [(HBOND_DISTANCE_CUTOFF, HBOND_ANGLE_CUTOFF)]
+    # Detect once with the loosest cutoffs; every criterion is a subset of that
+    loosest = (max(d for d, a in criteria), min(a for d, a in criteria))
+    all_pairs = search == 'all'
+    hbond_indices = resolve_hbond_indices(cms_file, asl1, asl2, all_pairs, use_cache, water_asl)
+    print(f"ASL1: {len(hbond_indices[0]['donor'])} potential donors, "
+          f"{len(hbond_indices[1]['acceptor'])} potential acceptors")
+    print(f"ASL2: {len(hbond_indices[1]['donor'])} potential donors, "
+          f"{len(hbond_indices[0]['acceptor'])} potential acceptors")
+    
+    print(f"Loading trajectory from: {trj_path}")
+    trj_frames = select_frames(open_trajectory(trj_path, stream), start, end, stride)
+    n_frames = None if stream else len(trj_frames)
+    print(f"Total frames: {n_frames if n_frames is not None else 'streaming'}")
+    
+    # Data storage: pair id x frame occupancy with float32 distances/angles, one per criterion
+    occupancies = [HbondOccupancy(keep_samples=not stream,
+                                  distance_range=(HISTOGRAM_MIN_DISTANCE, distance_cutoff),
+                                  angle_range=(angle_cutoff, 180.0), max_lag=acf_lags)
+                   for distance_cutoff, angle_cutoff in criteria]
+    atom_labels = {}  # atom index -> label, only used when writing output
+    for hbond_index in hbond_indices[:2]:
+        atom_labels.update(zip(hbond_index['donor'].tolist(), hbond_index['donor_label']))
+        atom_labels.update(zip(hbond_index['acceptor'].tolist(), hbond_index['acceptor_label']))
+    
+    # Water link indices (if any) share the atom slice but feed the bridge detection only
+    atoms, local_indices = localize_hbond_indices(hbond_indices)
+    hbond_indices, local_indices, link_indices = hbond_indices[:2], local_indices[:2], local_indices[2:]
+    bridge_index = bridge_occupancy = None
+    if water_asl is not None:
+        bridge_index = build_bridge_index(link_indices, criteria[0])
+        bridge_occupancy = HbondOccupancy(keep_samples=not stream,
+                                          distance_range=(HISTOGRAM_MIN_DISTANCE, 2 * criteria[0][0]),
+                                          angle_range=(0.0, 180.0), max_lag=acf_lags)
+    
+    frame_times = []
+    chunks = read_frame_chunks(trj_frames, atoms, chunk_size,
+                               read_box=True,
+                               frame_times=frame_times)
+    worker_stats = defaultdict(lambda: [0, 0.0])  # pid -> [frames, seconds]
+    n_read = 0
+    
+    print(f"\nAnalyzing frames with {nproc} process(es)...")
+    for first_frame, detections, bridges, pid, elapsed in iterate_detections(chunks, local_indices, search,
+                                                                             nproc, loosest, bridge_index):
+        worker_stats[pid][0] += len(detections)
+        worker_stats[pid][1] += elapsed
+        n_read += len(detections)
+        batch = []
+        for frame_idx, frame_hbonds in enumerate(detections, first_frame):
+            if frame_idx % 100 == 0:
+                print(f"  Processing frame {frame_idx}/{n_frames if n_frames is not None else '?'}...")
+            
+            for hbond_index, (donors, acceptors, distances, angles) in zip(hbond_indices, frame_hbonds):
+                batch.append((np.full(len(donors), frame_idx), hbond_index['donor'][donors],
+                              hbond_index['acceptor'][acceptors], distances, angles))
+        if bridges is not None:
+            bridge_occupancy.add_detections(*(np.concatenate(column) for column in zip(
+                *((np.full(len(atoms_1), frame_idx), atoms[atoms_1], atoms[atoms_2], distances, angles)
+                  for frame_idx, (atoms_1, atoms_2, distances, angles) in enumerate(bridges, first_frame)))))
+        if not batch:
+            continue
+        frames, donors, acceptors, distances, angles = (np.concatenate(column) for column in zip(*batch))
+        for occupancy, (distance_cutoff, angle_cutoff) in zip(occupancies, criteria):
+            if (distance_cutoff, angle_cutoff) == loosest:
+                occupancy.add_detections(frames, donors, acceptors, distances, angles)
+                continue
+            keep = (distances <= distance_cutoff) & (angles >= angle_cutoff)
+            occupancy.add_detections(frames[keep], donors[keep], acceptors[keep],
+                                     distances[keep], angles[keep])
+    
+    report_worker_throughput(worker_stats)
+    n_frames = n_read
+    if n_frames == 0:
+        print("ERROR: No frames found in trajectory.")
+        sys.exit(1)
+    # Time between analyzed frames (ns); already includes the stride
+    time_step = (frame_times[1] - frame_times[0]) / 1000.0 if len(frame_times) == 2 else float('nan')
+    print(f"Time between analyzed frames: {time_step:.4f} ns")
+    
+    # Run metadata of the statistics records; the time covers the detection pass
+    metadata = None
+    if stats_format is not None:
+        metadata = run_metadata('hbond_analysis', start_time,
+                                cms_file=os.path.abspath(cms_file), trajectory=os.path.abspath(trj_path),
+                                asl1=asl1, asl2=asl2, search=search,
+                                frames=f"{start}:{end if end is not None else ''}:{stride}")
+    
+    if bridge_occupancy is not None:
+        print(f"\nWater bridges (ASL1-water-ASL2):")
+        write_hbond_outputs(bridge_occupancy, atom_labels, n_frames, time_step,
+                            f"{output_prefix}_water_bridge", link='-WAT-', plots=False,
+                            stats_format=stats_format,
+                            metadata=metadata and dict(metadata, kind='water_bridge', water_asl=water_asl,
+                                                       distance_cutoff=criteria[0][0],
+                                                       angle_cutoff=criteria[0][1]))
+    
+    if len(criteria) == 1:
+        results = write_hbond_outputs(occupancies[0], atom_labels, n_frames, time_step, output_prefix,
+                                      stats_format=stats_format,
+                                      metadata=metadata and dict(metadata, kind='hbond',
+                                                                 distance_cutoff=criteria[0][0],
+                                                                 angle_cutoff=criteria[0][1]))
+        print(f"\nAnalysis complete!")
+        print(f"Output files generated with prefix: {output_prefix}")
+        return results
+    
+    all_results = []
+    for occupancy, criterion in zip(occupancies, criteria):
+        print(f"\nCriterion D-A <= {criterion[0]:g} A, D-H-A >= {criterion[1]:g} degrees:")
+        all_results.append(write_hbond_outputs(occupancy, atom_labels, n_frames, time_step,
+                                               criterion_prefix(output_prefix, criterion),
+                                               stats_format=stats_format,
+                                               metadata=metadata and dict(metadata, kind='hbond',
+                                                                          distance_cutoff=criterion[0],
+                                                                          angle_cutoff=criterion[1])))
+    write_criteria_summary_csv(criteria, all_results, output_prefix, n_frames)
+    
+    print(f"\nAnalysis complete!")
+    print(f"Output files generated with prefixes: {output_prefix}_d*_a*")
+    
+    return all_results
+
+
+def criterion_prefix(output_prefix, criterion):
+    """Output prefix of one criterion in a multi-criteria run, e.g. hbond_d3.5_a120."""
+    return f"{output_prefix}_d{criterion[0]:g}_a{criterion[1]:g}"
+
+
+def write_hbond_outputs(occupancy, atom_labels, n_frames, time_step, output_prefix, link='-', plots=True,
+                        stats_format=None, metadata=None):
+    """
+    Calculate statistics for one occupancy store and write its CSV files and plots.
+    With stats_format, the pairs are also written as records carrying metadata.
+    """
+    print(f"\nFound {occupancy.n_pairs} unique H-bond types in {n_frames} frames")
     
     # Calculate statistics
-    results = calculate_statistics(hbond_frames, all_distances, all_angles, n_frames)
+    results = calculate_statistics(occupancy, atom_labels, n_frames, link)
     
     # Write outputs
     write_occupancy_csv(results, output_prefix, n_frames)
-    write_lifetime_csv(results, output_prefix, n_frames)
+    write_lifetime_csv(results, output_prefix, n_frames, time_step)
     write_detailed_csv(results, output_prefix, n_frames)
+    if stats_format is not None:
+        write_hbond_records(results, output_prefix, n_frames, time_step, stats_format, metadata)
+    if occupancy.n_pairs:
+        lags, c_continuous, c_intermittent = calculate_autocorrelation(occupancy, n_frames)
+        write_autocorrelation_csv(lags, c_continuous, c_intermittent, output_prefix, time_step)
     
     # Generate plots
-    if plt is not None:
-        plot_distributions(global_distances, global_angles, output_prefix)
+    if plots and plt is not None:
+        plot_distributions(occupancy.distance_hist, occupancy.angle_hist, output_prefix)
         plot_occupancy_bar(results, output_prefix)
     
-    print(f"\nAnalysis complete!")
-    print(f"Output files generated with prefix: {output_prefix}")
-    
     return results
 
 
-def calculate_statistics(hbond_frames, all_distances, all_angles, n_frames):
-    """Calculate occupancy and lifetime statistics for each H-bond."""
-    results = []
-    
-    for key in hbond_frames:
-        frames = sorted(hbond_frames[key])
-        occupancy = len(frames) / n_frames * 100
-        
-        # Calculate lifetimes (consecutive frame stretches)
-        lifetimes = []
-        if frames:
-            current_lifetime = 1
-            for i in range(1, len(frames)):
-                if frames[i] == frames[i-1] + 1:
-                    current_lifetime += 1
-                else:
-                    lifetimes.append(current_lifetime)
-                    current_lifetime = 1
-            lifetimes.append(current_lifetime)
-        
-        avg_lifetime = np.mean(lifetimes) if lifetimes else 0
-        max_lifetime = max(lifetimes) if lifetimes else 0
-        
-        # Distance and angle statistics
-        distances = all_distances[key]
-        angles = all_angles[key]
+def pair_batches(n_pairs, n_frames):
+    """Split pair ids into batches whose unpacked presence matrix stays below PAIR_BATCH_ELEMENTS."""
+    batch_size = max(1, PAIR_BATCH_ELEMENTS // max(n_frames, 1))
+    for start in range(0, n_pairs, batch_size):
+        yield np.arange(start, min(start + batch_size, n_pairs))
+
+
+def run_lengths(presence):
+    """
+    Vectorized run-length encoding of a boolean (pair x frame) presence matrix.
+    Returns (rows, lengths): the row of every consecutive stretch of True values
+    and its length in frames, ordered by row and then by frame.
+    """
+    padded = np.zeros((presence.shape[0], presence.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = presence
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, ends - starts
+
+
+def calculate_statistics(occupancy, atom_labels, n_frames, link='-'):
+    """
+    Calculate occupancy and lifetime statistics for all H-bonds at once.
+    link joins the two atom labels of a pair key (e.g. "-WAT-" for water bridges).
+    """
+    n_pairs = occupancy.n_pairs
+    if occupancy.keep_samples:
+        n_present = np.zeros(n_pairs, dtype=np.int64)
+        n_events = np.zeros(n_pairs, dtype=np.int64)
+        total_lifetime = np.zeros(n_pairs, dtype=np.int64)
+        max_lifetime = np.zeros(n_pairs, dtype=np.int64)
         
+        # Lifetimes (consecutive frame stretches) from the run-length encoded presence matrix
+        for batch in pair_batches(n_pairs, n_frames):
+            presence = occupancy.presence(batch, n_frames)
+            rows, lengths = run_lengths(presence)
+            rows = batch[rows]
+            n_present[batch] = presence.sum(axis=1)
+            n_events += np.bincount(rows, minlength=n_pairs)
+            total_lifetime += np.bincount(rows, weights=lengths, minlength=n_pairs).astype(np.int64)
+            np.maximum.at(max_lifetime, rows, lengths)
+    else:
+        # Streaming mode counted the runs block by block
+        n_present, n_events, total_lifetime, max_lifetime = occupancy.stream_lifetimes()
+    avg_lifetime = total_lifetime / np.maximum(n_events, 1)
+    
+    # Distance and angle statistics per pair id
+    distance_mean, distance_std, angle_mean, angle_std = occupancy.geometry_statistics()
+    
+    labels = occupancy.labels(atom_labels, link)
+    results = []
+    for pair_id in range(n_pairs):
         results.append({
-            'key': key,
-            'occupancy': occupancy,
-            'n_frames': len(frames),
-            'avg_lifetime': avg_lifetime,
-            'max_lifetime': max_lifetime,
-            'n_events': len(lifetimes),
-            'avg_distance': np.mean(distances),
-            'std_distance': np.std(distances),
-            'avg_angle': np.mean(angles),
-            'std_angle': np.std(angles),
+            'key': labels[pair_id],
+            'occupancy': n_present[pair_id] / n_frames * 100,
+            'n_frames': int(n_present[pair_id]),
+            'avg_lifetime': avg_lifetime[pair_id],
+            'max_lifetime': int(max_lifetime[pair_id]),
+            'n_events': int(n_events[pair_id]),
+            'avg_distance': distance_mean[pair_id],
+            'std_distance': distance_std[pair_id],
+            'avg_angle': angle_mean[pair_id],
+            'std_angle': angle_std[pair_id],
         })
     
     # Sort by occupancy (descending)
@@ -299,6 +1237,89 @@ def calculate_statistics(hbond_frames, all_distances, all_angles, n_frames):
     return results
 
 
+def calculate_autocorrelation(occupancy, n_frames):
+    """
+    Calculate the continuous and intermittent H-bond autocorrelation functions,
+    averaged over all H-bonds: C(t) = <h(0) H(t)> / <h> and C(t) = <h(0) h(t)> / <h>.
+    The intermittent C(t) uses zero-padded FFTs (O(T log T) per pair); the continuous
+    C(t) follows directly from the run-length histogram, since a stretch of L frames
+    contributes max(L - t, 0) time origins that stay bonded up to lag t.
+    In streaming mode the sums were accumulated block by block, and only lags below
+    occupancy.max_lag are returned.
+    Returns (lags, c_continuous, c_intermittent) in frames.
+    """
+    if occupancy.keep_samples:
+        n_lags = n_frames
+        intermittent = np.zeros(n_frames)
+        length_counts = np.zeros(n_frames + 1)
+        long_runs = (0, 0)
+        n_fft = 1 << (2 * n_frames - 1).bit_length()
+        
+        for batch in pair_batches(occupancy.n_pairs, n_frames):
+            presence = occupancy.presence(batch, n_frames)
+            spectrum = np.fft.rfft(presence.astype(np.float64), n=n_fft, axis=1)
+            intermittent += np.fft.irfft(np.abs(spectrum)**2, n=n_fft, axis=1)[:, :n_frames].sum(axis=0)
+            _, lengths = run_lengths(presence)
+            length_counts += np.bincount(lengths, minlength=n_frames + 1)
+    else:
+        n_lags = min(n_frames, occupancy.max_lag)
+        intermittent, length_counts, long_runs = occupancy.stream_autocorrelation()
+        intermittent = intermittent[:n_lags]
+    lags = np.arange(n_lags)
+    
+    # sum over stretches of max(L - t, 0) = sum_{L > t} L * n(L) - t * sum_{L > t} n(L),
+    # stretches longer than the histogram are counted in long_runs (number, total length)
+    longer_count = np.cumsum(length_counts[::-1])[::-1][1:n_lags + 1] + long_runs[0]
+    longer_total = np.cumsum((np.arange(len(length_counts)) * length_counts)[::-1])[::-1][1:n_lags + 1] + long_runs[1]
+    continuous = longer_total - lags * longer_count
+    
+    # Average over the n_frames - t time origins and normalize by <h>
+    origins = n_frames - lags
+    norm = intermittent[0] / n_frames if intermittent[0] > 0 else 1.0
+    c_intermittent = np.rint(intermittent) / origins / norm
+    c_continuous = continuous / origins / norm
+    return lags, c_continuous, c_intermittent
+
+
+def fit_relaxation_time(lags, acf, threshold=0.05):
+    """
+    Fit C(t) = exp(-t / tau) by least squares on ln C(t) over the initial decay
+    (up to the first lag where C(t) drops below threshold). Also returns the
+    integrated relaxation time (sum of C(t) over the same range).
+    Returns (tau_fit, tau_integral) in the units of lags.
+    """
+    below = np.nonzero(acf < threshold)[0]
+    stop = below[0] if len(below) else len(acf)
+    t, c = lags[1:stop], acf[1:stop]
+    tau_integral = float(np.sum(acf[:stop]) * (lags[1] - lags[0])) if len(lags) > 1 else 0.0
+    slope_den = np.sum(t * np.log(c)) if len(t) else 0.0
+    tau_fit = float(-np.sum(t * t) / slope_den) if slope_den < 0 else float('inf')
+    return tau_fit, tau_integral
+
+
+def write_autocorrelation_csv(lags, c_continuous, c_intermittent, output_prefix, time_step=float('nan')):
+    """
+    Write H-bond autocorrelation functions and fitted relaxation times to CSV.
+    time_step is the time (ns) between analyzed frames, including any stride.
+    """
+    filename = f"{output_prefix}_autocorrelation.csv"
+    with open(filename, 'w') as f:
+        f.write("Lag(frames),Lag(ns),C_Continuous,C_Intermittent\n")
+        for lag, c_c, c_i in zip(lags, c_continuous, c_intermittent):
+            f.write(f"{lag},{lag * time_step:.4f},{c_c:.6f},{c_i:.6f}\n")
+    print(f"  Written: {filename}")
+    
+    filename = f"{output_prefix}_relaxation.csv"
+    with open(filename, 'w') as f:
+        f.write("ACF,Tau_Fit(frames),Tau_Integral(frames),Tau_Fit(ns),Tau_Integral(ns)\n")
+        for name, acf in (('Continuous', c_continuous), ('Intermittent', c_intermittent)):
+            tau_fit, tau_integral = fit_relaxation_time(lags, acf)
+            f.write(f"{name},{tau_fit:.3f},{tau_integral:.3f},{tau_fit * time_step:.4f},{tau_integral * time_step:.4f}\n")
+            print(f"  {name} H-bond relaxation time: {tau_fit * time_step:.4f} ns (fit), "
+                  f"{tau_integral * time_step:.4f} ns (integral)")
+    print(f"  Written: {filename}")
+
+
 def write_occupancy_csv(results, output_prefix, n_frames):
     """Write H-bond occupancy data to CSV."""
     filename = f"{output_prefix}_occupancy.csv"
@@ -309,13 +1330,30 @@ def write_occupancy_csv(results, output_prefix, n_frames):
     print(f"  Written: {filename}")
 
 
-def write_lifetime_csv(results, output_prefix, n_frames):
-    """Write H-bond lifetime data to CSV."""
+def write_lifetime_csv(results, output_prefix, n_frames, time_step=float('nan')):
+    """
+    Write H-bond lifetime data to CSV.
+    time_step is the time (ns) between analyzed frames, including any stride.
+    """
     filename = f"{output_prefix}_lifetime.csv"
     with open(filename, 'w') as f:
-        f.write("Rank,H-bond,Avg_Lifetime(frames),Max_Lifetime(frames),N_Events,Occupancy(%)\n")
+        f.write("Rank,H-bond,Avg_Lifetime(frames),Max_Lifetime(frames),N_Events,Occupancy(%),"
+                "Avg_Lifetime(ns),Max_Lifetime(ns)\n")
         for i, r in enumerate(results, 1):
-            f.write(f"{i},{r['key']},{r['avg_lifetime']:.2f},{r['max_lifetime']},{r['n_events']},{r['occupancy']:.2f}\n")
+            f.write(f"{i},{r['key']},{r['avg_lifetime']:.2f},{r['max_lifetime']},{r['n_events']},{r['occupancy']:.2f},")
+            f.write(f"{r['avg_lifetime'] * time_step:.4f},{r['max_lifetime'] * time_step:.4f}\n")
+    print(f"  Written: {filename}")
+
+
+def write_criteria_summary_csv(criteria, all_results, output_prefix, n_frames):
+    """Write one row per H-bond criterion of a multi-criteria run."""
+    filename = f"{output_prefix}_criteria.csv"
+    with open(filename, 'w') as f:
+        f.write("Distance_Cutoff(A),Angle_Cutoff(deg),Output_Prefix,N_Hbond_Types,Avg_Hbonds_Per_Frame\n")
+        for criterion, results in zip(criteria, all_results):
+            n_hbonds = sum(r['n_frames'] for r in results)
+            f.write(f"{criterion[0]:g},{criterion[1]:g},{criterion_prefix(output_prefix, criterion)},"
+                    f"{len(results)},{n_hbonds / n_frames:.3f}\n")
     print(f"  Written: {filename}")
 
 
@@ -332,18 +1370,48 @@ def write_detailed_csv(results, output_prefix, n_frames):
     print(f"  Written: {filename}")
 
 
-def plot_distributions(distances, angles, output_prefix):
-    """Plot distance and angle distributions."""
-    if not distances or not angles:
+def write_hbond_records(results, output_prefix, n_frames, time_step, stats_format, metadata):
+    """
+    Write one statistics record per H-bond pair, with the run metadata, to
+    <output_prefix>_statistics.<stats_format> for stats_merge.py.
+    """
+    records = []
+    for i, r in enumerate(results, 1):
+        records.append(dict(
+            metadata,
+            output=output_prefix,
+            total_frames=n_frames,
+            time_step_ns=time_step,
+            rank=i,
+            hbond=r['key'],
+            occupancy=r['occupancy'],
+            frames_present=r['n_frames'],
+            avg_lifetime_frames=r['avg_lifetime'],
+            max_lifetime_frames=r['max_lifetime'],
+            n_events=r['n_events'],
+            avg_lifetime_ns=r['avg_lifetime'] * time_step,
+            max_lifetime_ns=r['max_lifetime'] * time_step,
+            avg_distance=r['avg_distance'],
+            std_distance=r['std_distance'],
+            avg_angle=r['avg_angle'],
+            std_angle=r['std_angle'],
+        ))
+    write_records(records, stats_filename(output_prefix, stats_format), stats_format)
+
+
+def plot_distributions(distance_hist, angle_hist, output_prefix):
+    """Plot distance and angle distributions from fixed-bin histograms."""
+    if distance_hist.n == 0 or angle_hist.n == 0:
         print("  No H-bond data for distribution plots.")
         return
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
     
     # Distance distribution
-    ax1.hist(distances, bins=50, color='#2E86AB', edgecolor='black', alpha=0.7)
-    ax1.axvline(np.mean(distances), color='#E94F37', linestyle='--', 
-                linewidth=2, label=f"Mean: {np.mean(distances):.2f} A")
+    ax1.bar(distance_hist.edges[:-1], distance_hist.counts, width=np.diff(distance_hist.edges),
+            align='edge', color='#2E86AB', edgecolor='black', alpha=0.7)
+    ax1.axvline(distance_hist.mean, color='#E94F37', linestyle='--', 
+                linewidth=2, label=f"Mean: {distance_hist.mean:.2f} A")
     ax1.set_xlabel('Donor-Acceptor Distance (A)', fontsize=12)
     ax1.set_ylabel('Frequency', fontsize=12)
     ax1.set_title('H-bond Distance Distribution', fontsize=14, fontweight='bold')
@@ -351,9 +1419,10 @@ def plot_distributions(distances, angles, output_prefix):
     ax1.grid(True, alpha=0.3)
     
     # Angle distribution
-    ax2.hist(angles, bins=50, color='#28A745', edgecolor='black', alpha=0.7)
-    ax2.axvline(np.mean(angles), color='#E94F37', linestyle='--', 
-                linewidth=2, label=f"Mean: {np.mean(angles):.1f} deg")
+    ax2.bar(angle_hist.edges[:-1], angle_hist.counts, width=np.diff(angle_hist.edges),
+            align='edge', color='#28A745', edgecolor='black', alpha=0.7)
+    ax2.axvline(angle_hist.mean, color='#E94F37', linestyle='--', 
+                linewidth=2, label=f"Mean: {angle_hist.mean:.1f} deg")
     ax2.set_xlabel('D-H-A Angle (degrees)', fontsize=12)
     ax2.set_ylabel('Frequency', fontsize=12)
     ax2.set_title('H-bond Angle Distribution', fontsize=14, fontweight='bold')
@@ -428,18 +1497,146 @@ def plot_occupancy_bar(results, output_prefix, top_n=20):
     print(f"  Written: {output_prefix}_occupancy.png/pdf")
 
 
+def parse_criterion(text):
+    """Parse a DISTANCE:ANGLE criterion such as 3.5:120 into a (distance, angle) tuple."""
+    try:
+        distance, angle = (float(value) for value in text.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid criterion '{text}', expected DISTANCE:ANGLE (e.g. 3.5:120)")
+    if distance <= 0 or not 0 <= angle <= 180:
+        raise argparse.ArgumentTypeError(f"invalid criterion '{text}': distance must be > 0, angle in [0, 180]")
+    return distance, angle
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Advanced hydrogen bond analysis (occupancy, lifetime, distributions)',
+        epilog='Example: $SCHRODINGER/run hbond_analysis.py system-out.cms system_trj "protein" "ligand" hbond_analysis'
+    )
+    parser.add_argument('cms_file', help='Input CMS file')
+    parser.add_argument('trajectory', help='Trajectory directory')
+    parser.add_argument('asl1', help='ASL of selection 1')
+    parser.add_argument('asl2', help='ASL of selection 2')
+    parser.add_argument('output_prefix', help='Output file prefix')
+    parser.add_argument(
+        '--search',
+        choices=['all', 'kdtree'],
+        default='all',
+        help='Candidate pair search: "all" donor x acceptor pairs, or "kdtree" neighbor search '
+             'within the distance cutoff; both apply periodic boundaries and only differ in speed '
+             '(default: all)'
+    )
+    parser.add_argument(
+        '--nproc',
+        type=int,
+        default=1,
+        help='Number of worker processes for frame-parallel detection (default: 1)'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Streaming mode: read frames lazily and keep only running statistics, '
+             'so memory does not grow with trajectory length; the autocorrelation '
+             'functions are limited to --acf-lags lags'
+    )
+    parser.add_argument(
+        '--acf-lags',
+        type=int,
+        default=STREAM_ACF_LAGS,
+        help=f'Autocorrelation lags (frames) kept in streaming mode; memory is two blocks of '
+             f'this many frames per H-bond pair (default: {STREAM_ACF_LAGS})'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=FRAME_CHUNK_SIZE,
+        help=f'Frames read and processed per chunk (default: {FRAME_CHUNK_SIZE})'
+    )
+    parser.add_argument(
+        '--start',
+        type=int,
+        default=0,
+        help='First frame to analyze (default: 0)'
+    )
+    parser.add_argument(
+        '--end',
+        type=int,
+        default=None,
+        help='Stop before this frame (default: last frame)'
+    )
+    parser.add_argument(
+        '--stride',
+        type=int,
+        default=1,
+        help='Analyze every N-th frame (default: 1)'
+    )
+    parser.add_argument(
+        '--distance-cutoff',
+        type=float,
+        default=HBOND_DISTANCE_CUTOFF,
+        help=f'Maximum donor-acceptor distance in Angstrom (default: {HBOND_DISTANCE_CUTOFF})'
+    )
+    parser.add_argument(
+        '--angle-cutoff',
+        type=float,
+        default=HBOND_ANGLE_CUTOFF,
+        help=f'Minimum D-H-A angle in degrees (default: {HBOND_ANGLE_CUTOFF})'
+    )
+    parser.add_argument(
+        '--criteria',
+        nargs='+',
+        type=parse_criterion,
+        default=None,
+        metavar='DISTANCE:ANGLE',
+        help='Evaluate several criteria in one trajectory pass, e.g. --criteria 3.0:150 3.5:120; '
+             'each criterion writes <output_prefix>_d<DISTANCE>_a<ANGLE>_* files '
+             '(overrides --distance-cutoff/--angle-cutoff)'
+    )
+    parser.add_argument(
+        '--water-bridges',
+        action='store_true',
+        help='Also detect ASL1-water-ASL2 bridges and write <output_prefix>_water_bridge_* files '
+             '(distance/angle columns: ASL1-ASL2 atom distance and angle at the water oxygen)'
+    )
+    parser.add_argument(
+        '--water-asl',
+        default='water',
+        help='ASL of the bridging waters; atoms in ASL1/ASL2 are excluded (default: "water")'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the donor/acceptor index cache (<cms>_hbond_<hash>.npz)'
+    )
+    parser.add_argument(
+        '--stats-format',
+        choices=STATS_FORMATS,
+        default=None,
+        help='Also write one record per H-bond pair with the run metadata to '
+             '<output_prefix>_statistics.<format>, to be merged across jobs by stats_merge.py'
+    )
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error('--stride must be a positive integer')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be a positive integer')
+    if args.acf_lags < 1:
+        parser.error('--acf-lags must be a positive integer')
+    if args.criteria is None:
+        args.criteria = [parse_criterion(f"{args.distance_cutoff}:{args.angle_cutoff}")]
+    # Drop duplicate criteria, keeping the order given on the command line
+    args.criteria = list(dict.fromkeys(args.criteria))
+    return args
+
+
 def main():
-    if len(sys.argv) != 6:
-        print("Usage: $SCHRODINGER/run hbond_analysis.py <cms_file> <trajectory> <asl1> <asl2> <output_prefix>")
-        print("\nExample:")
-        print('  $SCHRODINGER/run hbond_analysis.py system-out.cms system_trj "protein" "ligand" hbond_analysis')
-        sys.exit(1)
-    
-    cms_file = sys.argv[1]
-    trj_path = sys.argv[2]
-    asl1 = sys.argv[3]
-    asl2 = sys.argv[4]
-    output_prefix = sys.argv[5]
+    args = parse_args()
+    cms_file = args.cms_file
+    trj_path = args.trajectory
+    asl1 = args.asl1
+    asl2 = args.asl2
+    output_prefix = args.output_prefix
     
     # Validate inputs
     if not os.path.exists(cms_file):
@@ -450,6 +1647,13 @@ def main():
         print(f"ERROR: Trajectory not found: {trj_path}")
         sys.exit(1)
     
+    if (args.search == 'kdtree' or args.water_bridges) and cKDTree is None:
+        print("ERROR: scipy is required for --search kdtree and --water-bridges.")
+        sys.exit(1)
+    
+    if args.stats_format is not None:
+        check_stats_format(args.stats_format)
+    
     print("=" * 60)
     print("Advanced Hydrogen Bond Analysis")
     print("=" * 60)
@@ -458,12 +1662,21 @@ def main():
     print(f"ASL 1:       {asl1}")
     print(f"ASL 2:       {asl2}")
     print(f"Output:      {output_prefix}_*")
+    print(f"Search:      {args.search}")
+    print(f"Processes:   {args.nproc}")
+    print(f"Streaming:   {'yes' if args.stream else 'no'} (chunk size {args.chunk_size} frames)")
+    print(f"Frames:      {args.start}:{args.end if args.end is not None else ''}:{args.stride}")
+    print(f"Water:       {args.water_asl if args.water_bridges else 'direct H-bonds only'}")
     print(f"\nH-bond criteria:")
-    print(f"  D-A distance cutoff: {HBOND_DISTANCE_CUTOFF} A")
-    print(f"  D-H-A angle cutoff:  {HBOND_ANGLE_CUTOFF} degrees")
+    for distance_cutoff, angle_cutoff in args.criteria:
+        print(f"  D-A distance cutoff: {distance_cutoff} A, D-H-A angle cutoff: {angle_cutoff} degrees")
     print("=" * 60)
     
-    analyze_trajectory(cms_file, trj_path, asl1, asl2, output_prefix)
+    analyze_trajectory(cms_file, trj_path, asl1, asl2, output_prefix, search=args.search, nproc=args.nproc,
+                       stream=args.stream, chunk_size=args.chunk_size,
+                       start=args.start, end=args.end, stride=args.stride, use_cache=not args.no_cache,
+                       criteria=args.criteria, water_asl=args.water_asl if args.water_bridges else None,
+                       stats_format=args.stats_format, acf_lags=args.acf_lags)
 
 
 if __name__ == '__main__':
@@ -6,8 +6,18 @@ Part of AutoMD: https://github.com/Wang-Lin-boop/AutoMD
 This script generates publication-quality RMSD time-series plots from CSV data
 produced by Desmond's analyze_simulation.py.
 
+Every numeric column after the first (time/frame) column of every input file is
+a series. Several series are drawn overlaid in one figure, as one panel each
+(facet), or as separate figures that can be rendered in parallel (--jobs).
+Series longer than the figure is wide are drawn as the per-pixel minimum and
+maximum (statistics use every frame); --no-decimate draws every frame.
+The equilibration cut of every series is detected and marked, and the
+production frames after it get a block-averaged standard error.
+
 Usage:
     python rmsd_plot.py -f <input.csv> -o <output_prefix> [-t <title>] [--total-time <ns>]
+    python rmsd_plot.py -f rep1_RMSD.csv rep2_RMSD.csv ... -o <output_prefix> --layout facet
+    python rmsd_plot.py -f <input.csv> -o <output_prefix> --stats-format json
 
 Author: AutoMD Development Team
 """
@@ -15,17 +25,45 @@ Author: AutoMD Development Team
 import argparse
 import sys
 import os
+import io
+import re
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 try:
-    import matplotlib
-    matplotlib.use('Agg')  # Non-interactive backend for server use
-    import matplotlib.pyplot as plt
     import numpy as np
 except ImportError as e:
     print(f"ERROR: Required package not found: {e}")
     print("Please ensure matplotlib and numpy are installed.")
     sys.exit(1)
 
+from stats_merge import STATS_FORMATS, check_stats_format, run_metadata, stats_filename, write_records
+
+# matplotlib is imported by load_pyplot() when the plot is drawn,
+# so argument errors and --help do not pay for it
+plt = None
+
+# line colors of the series, the first one is the color of a single series plot
+SERIES_COLORS = ['#2E86AB', '#E94F37', '#28A745', '#F18F01', '#6F2DBD',
+                 '#C73E1D', '#3B1F2B', '#17BEBB', '#8D6A9F', '#5B8E7D']
+
+
+def load_pyplot():
+    """Import matplotlib.pyplot with the non-interactive backend."""
+    global plt
+    if plt is not None:
+        return plt
+    try:
+        import matplotlib
+        matplotlib.use('Agg')  # Non-interactive backend for server use
+        import matplotlib.pyplot as plt
+    except ImportError as e:
+        print(f"ERROR: Required package not found: {e}")
+        print("Please ensure matplotlib and numpy are installed.")
+        sys.exit(1)
+    return plt
+
 
 def parse_args():
     """Parse command line arguments."""
@@ -33,9 +71,10 @@ def parse_args():
         description='Plot RMSD time-series from CSV data'
     )
     parser.add_argument(
-        '-f', '--file', 
+        '-f', '--file',
         required=True,
-        help='Input CSV file from Desmond analyze_simulation'
+        nargs='+',
+        help='Input CSV file(s) from Desmond analyze_simulation, every numeric column after the first is a series'
     )
     parser.add_argument(
         '-o', '--output',
@@ -65,50 +104,379 @@ def parse_args():
         default='ns',
         help='Time unit for x-axis when --total-time is provided (default: ns)'
     )
+    parser.add_argument(
+        '--layout',
+        choices=['overlay', 'facet', 'separate'],
+        default='overlay',
+        help='How to draw several series: overlaid in one figure, one panel per series, '
+             'or one figure per series named <prefix>_<label> (default: overlay)'
+    )
+    parser.add_argument(
+        '-c', '--columns',
+        type=int,
+        nargs='+',
+        default=None,
+        help='RMSD columns to plot from every file, counted from 1 after the time/frame column '
+             '(default: all numeric columns)'
+    )
+    parser.add_argument(
+        '--labels',
+        nargs='+',
+        default=None,
+        help='Labels of the series, in the order of the files and columns '
+             '(default: file name and column header)'
+    )
+    parser.add_argument(
+        '--titles',
+        nargs='+',
+        default=None,
+        help='Titles of the figures of --layout separate, one per series '
+             '(default: "<title> - <label>")'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Number of processes drawing independent figures of --layout separate (default: 1)'
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        default=False,
+        help='Keep the parsed data in a memory-mapped <file>.npy next to each input and reuse it '
+             'while the input is unchanged'
+    )
+    parser.add_argument(
+        '--no-decimate',
+        action='store_true',
+        default=False,
+        help='Draw every frame instead of the per-pixel minimum and maximum of long series '
+             '(exact but large PDF files)'
+    )
+    parser.add_argument(
+        '--stats-format',
+        choices=STATS_FORMATS,
+        default=None,
+        help='Also write one record per series to <prefix>_statistics.<format>, '
+             'to be merged across jobs by stats_merge.py'
+    )
     return parser.parse_args()
 
 
-def read_csv_data(filename):
+def sniff_csv_format(filename):
     """
-    Read RMSD data from CSV file.
-    Expected format: Time/Frame, RMSD value(s)
-    Returns time array and RMSD array.
+    Detect the delimiter and the header of a CSV file from its first lines.
+    Returns the delimiter (None for whitespace) and whether the first line is a header.
     """
-    time_data = []
-    rmsd_data = []
-    
     with open(filename, 'r') as f:
-        lines = f.readlines()
+        head = [line.strip() for line in itertools.islice(f, 20)]
+    head = [line for line in head if line]
+    if not head:
+        return None, False
+    
+    # The delimiter is taken from a data line, the header may contain other characters
+    sample = head[1] if len(head) > 1 else head[0]
+    delimiter = None
+    for candidate in (',', '\t', ';'):
+        if candidate in sample:
+            delimiter = candidate
+            break
     
-    # Skip header line if present
-    start_idx = 0
-    if lines and not lines[0].strip()[0].isdigit():
-        start_idx = 1
+    # A header line has at least one field that is not a number; rows ending in the
+    # delimiter (e.g. "0.0,1.234,") have an empty last field that is not a column
+    has_header = False
+    for field in strip_trailing_fields(head[0], delimiter).split(delimiter):
+        try:
+            float(field)
+        except ValueError:
+            has_header = True
+            break
+    return delimiter, has_header
+
+
+def strip_trailing_fields(line, delimiter):
+    """
+    Remove the empty trailing fields of a delimited line.
+    """
+    if delimiter is None:
+        return line.strip()
+    return line.strip().rstrip(delimiter + ' ')
+
+
+def parse_csv_lines(data, delimiter, has_header):
+    """
+    Parse CSV bytes line by line, for files numpy cannot read in one go.
+    Returns the matrix and the column names, rows that are not numbers are NaN.
+    """
+    lines = data.decode().splitlines()
+    names = []
+    if has_header and lines:
+        names = [name.strip() for name in strip_trailing_fields(lines[0], delimiter).split(delimiter)]
+        lines = lines[1:]
     
-    for line in lines[start_idx:]:
-        line = line.strip()
+    rows = []
+    n_columns = len(names) if names else None
+    for line in lines:
+        line = strip_trailing_fields(line, delimiter)
         if not line:
             continue
-        
-        # Handle both comma and space-separated values
-        if ',' in line:
-            parts = line.split(',')
-        else:
-            parts = line.split()
-        
+        parts = line.split(delimiter)
+        # The number of columns is fixed by the header or the first row,
+        # extra trailing fields are ignored
+        if n_columns is None:
+            n_columns = len(parts)
         try:
-            # First column is typically time/frame, second is RMSD
-            if len(parts) >= 2:
-                time_data.append(float(parts[0]))
-                rmsd_data.append(float(parts[1]))
+            values = [float(part) for part in parts[:n_columns]]
         except ValueError:
-            continue
+            values = []
+        rows.append(values if len(values) == n_columns else [np.nan] * n_columns)
+    return np.array(rows, dtype=float).reshape(len(rows), n_columns or 0), names
+
+
+def load_csv_matrix(filename, delimiter, has_header):
+    """
+    Parse the numeric matrix of a CSV file with the pandas C engine, or numpy without pandas.
+    Returns the matrix, the column names and the number of rows that could not be parsed.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    
+    # Count the non-empty data rows, so the skipped ones can be reported
+    n_rows = sum(1 for line in data.splitlines() if line.strip())
+    n_rows = max(n_rows - (1 if has_header else 0), 0)
+    # The number of columns is fixed by the header or the first row; rows with extra
+    # trailing fields keep their leading columns, as in the line-by-line reader
+    first_line = strip_trailing_fields(data.lstrip().split(b'\n', 1)[0].decode(), delimiter)
+    n_columns = max(len(first_line.split(delimiter)), 1)
+    
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    
+    names = []
+    if pd is not None:
+        frame = pd.read_csv(
+            io.BytesIO(data),
+            sep=delimiter if delimiter is not None else r'\s+',
+            header=0 if has_header else None,
+            usecols=range(n_columns),
+            engine='c',
+            on_bad_lines='skip',
+            skipinitialspace=True,
+        )
+        if has_header:
+            names = [str(name).strip() for name in frame.columns]
+        # Fields that are not numbers become NaN and their rows are dropped below
+        matrix = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    else:
+        try:
+            matrix = np.loadtxt(io.BytesIO(data), delimiter=delimiter,
+                                skiprows=1 if has_header else 0, usecols=range(n_columns), ndmin=2)
+            if has_header:
+                first_line = strip_trailing_fields(data.split(b'\n', 1)[0].decode(), delimiter)
+                names = [name.strip() for name in first_line.split(delimiter)]
+        except ValueError:
+            matrix, names = parse_csv_lines(data, delimiter, has_header)
+    
+    valid = ~np.isnan(matrix).any(axis=1)
+    if not valid.all():
+        matrix = matrix[valid]
+    bad_rows = max(n_rows - len(matrix), 0)
+    return matrix, names, bad_rows
+
+
+def read_csv_data(filename, cache=False):
+    """
+    Read RMSD data from CSV file.
+    Expected format: Time/Frame, RMSD value(s)
+    Returns time array, RMSD matrix (frames x series) and the names of the RMSD columns.
+    With cache, the parsed data is kept in a memory-mapped <filename>.npy and reused
+    while the CSV file is unchanged (the cache carries the modification time of the CSV).
+    """
+    cache_file = f"{filename}.npy"
+    source_mtime = os.stat(filename).st_mtime_ns
+    if cache and os.path.exists(cache_file) and os.stat(cache_file).st_mtime_ns == source_mtime:
+        try:
+            records = np.load(cache_file, mmap_mode='r')
+            matrix = records.view(np.float64).reshape(len(records), -1)
+            names = list(records.dtype.names)
+            print(f"Loaded cached data from: {cache_file}")
+            return matrix[:, 0], matrix[:, 1:], names[1:]
+        except (OSError, ValueError, TypeError) as e:
+            print(f"WARNING: Ignoring unreadable cache {cache_file}: {e}")
+    
+    delimiter, has_header = sniff_csv_format(filename)
+    matrix, names, bad_rows = load_csv_matrix(filename, delimiter, has_header)
+    if bad_rows > 0:
+        print(f"WARNING: {bad_rows} rows of {filename} are not numbers or have the wrong number of fields, skipped.")
+    
+    if matrix.shape[1] < 2:
+        return np.array([]), np.empty((0, 1)), ['RMSD_1']
+    if len(names) != matrix.shape[1]:
+        names = ['Time'] + [f"RMSD_{i + 1}" for i in range(matrix.shape[1] - 1)]
+    
+    if cache and len(matrix) > 0:
+        # One float64 field per column, so the cache maps back to a plain matrix
+        fields = []
+        for name in names:
+            field = name or 'column'
+            while field in fields:
+                field = f"{field}_"
+            fields.append(field)
+        records = np.empty(len(matrix), dtype=[(field, np.float64) for field in fields])
+        records.view(np.float64).reshape(len(matrix), -1)[:] = matrix
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, 'wb') as f:
+                np.save(f, records)
+            os.utime(temp_file, ns=(source_mtime, source_mtime))
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            # The cache is optional, a read-only or full directory only costs the reuse
+            print(f"WARNING: Could not write the data cache {cache_file}: {e}")
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+        names = fields
+    
+    return matrix[:, 0], matrix[:, 1:], names[1:]
+
+
+def collect_series(files, labels=None, cache=False, columns=None, titles=None):
+    """
+    Read every input file and split it into series.
+    columns: 1-based RMSD columns (after the time column) taken from every file, default all.
+    titles: optional figure title of every series, for --layout separate.
+    Returns a list of dicts with the label, source file, time and RMSD arrays.
+    """
+    series = []
+    for filename in files:
+        time_data, rmsd_data, names = read_csv_data(filename, cache)
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        # An empty file keeps its placeholder column and is reported by main()
+        if columns is not None and len(time_data) > 0:
+            if not all(1 <= column <= len(names) for column in columns):
+                print(f"ERROR: {filename} has {len(names)} RMSD columns, cannot select {columns}.")
+                sys.exit(1)
+            names = [names[column - 1] for column in columns]
+            rmsd_data = rmsd_data[:, [column - 1 for column in columns]]
+        for i, name in enumerate(names):
+            if len(files) == 1:
+                label = name
+            elif len(names) == 1:
+                label = stem
+            else:
+                label = f"{stem}:{name}"
+            series.append({
+                'label': label,
+                'file': filename,
+                'time': time_data,
+                'rmsd': rmsd_data[:, i],
+            })
     
-    return np.array(time_data), np.array(rmsd_data)
+    if labels is not None:
+        if len(labels) != len(series):
+            print(f"ERROR: {len(labels)} labels given for {len(series)} series.")
+            sys.exit(1)
+        for item, label in zip(series, labels):
+            item['label'] = label
+    if titles is not None:
+        if len(titles) != len(series):
+            print(f"ERROR: {len(titles)} titles given for {len(series)} series.")
+            sys.exit(1)
+        for item, title in zip(series, titles):
+            item['title'] = title
+    return series
+
+
+def statistical_inefficiency(data):
+    """
+    Statistical inefficiency g of a correlated series, so that len(data) / g frames are
+    independent. The autocorrelation comes from an FFT and is summed up to its first
+    zero crossing, as in pymbar's timeseries module.
+    """
+    n_frames = len(data)
+    if n_frames < 3:
+        return 1.0
+    delta = data - np.mean(data)
+    variance = np.dot(delta, delta) / n_frames
+    if variance == 0:
+        return 1.0
+    
+    # Zero padding to a power of two >= 2N gives the linear (not circular) correlation
+    n_fft = 1 << (2 * n_frames - 1).bit_length()
+    spectrum = np.fft.rfft(delta, n_fft)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), n_fft)[:n_frames]
+    # C(t) * (1 - t/N), with C(t) normalized by the N - t overlapping pairs
+    weighted = correlation[1:] / (n_frames * variance)
+    normalized = correlation[1:] / ((n_frames - np.arange(1, n_frames)) * variance)
+    crossing = np.flatnonzero(normalized[2:] <= 0)
+    cutoff = crossing[0] + 2 if len(crossing) else len(weighted)
+    return max(1.0, 1.0 + 2.0 * np.sum(weighted[:cutoff]))
+
+
+def detect_equilibration(data, n_scan=100, max_scan_frames=20000):
+    """
+    Find the equilibration cut by maximizing the effective sample size (N - t0) / g(t0)
+    of the frames after t0 (Chodera, JCTC 2016). n_scan cuts over the first three
+    quarters of the series are tried; longer series than max_scan_frames are scanned
+    every few frames and only g of the chosen production part uses every frame.
+    Returns t0, g and the effective sample size.
+    """
+    n_frames = len(data)
+    if n_frames < 10:
+        g = statistical_inefficiency(data)
+        return 0, g, n_frames / g
+    
+    stride = -(-n_frames // max_scan_frames)
+    scan_data = data[::stride]
+    n_scan_frames = len(scan_data)
+    best_t0, best_n_eff = 0, 0.0
+    for t0 in np.unique(np.linspace(0, 3 * n_scan_frames // 4, n_scan).astype(int)):
+        n_eff = (n_scan_frames - t0) / statistical_inefficiency(scan_data[t0:])
+        if n_eff > best_n_eff:
+            best_t0, best_n_eff = int(t0), n_eff
+    
+    equil_frame = best_t0 * stride
+    g = statistical_inefficiency(data[equil_frame:])
+    return equil_frame, g, (n_frames - equil_frame) / g
+
+
+def block_average(data, min_blocks=8):
+    """
+    Standard error of the mean by block averaging over block sizes 1, 2, 4, ... frames
+    with at least min_blocks blocks (Flyvbjerg and Petersen, JCP 1989). The plateau is
+    the first block size whose error agrees with the next one within its own
+    uncertainty SEM / sqrt(2 (n_blocks - 1)).
+    Returns the error, its block size and whether a plateau was reached; without one,
+    the error of the largest block size is a lower bound.
+    """
+    n_frames = len(data)
+    if n_frames < 2 * min_blocks:
+        return (np.std(data, ddof=1) / np.sqrt(n_frames) if n_frames > 1 else 0.0), 1, False
+    
+    levels = []
+    block_size = 1
+    while n_frames // block_size >= min_blocks:
+        n_blocks = n_frames // block_size
+        means = data[:n_blocks * block_size].reshape(n_blocks, block_size).mean(axis=1)
+        sem = np.std(means, ddof=1) / np.sqrt(n_blocks)
+        levels.append((sem, sem / np.sqrt(2 * (n_blocks - 1)), block_size))
+        block_size *= 2
+    for (sem, error, block_size), (next_sem, _, _) in zip(levels, levels[1:]):
+        if abs(next_sem - sem) <= error:
+            return sem, block_size, True
+    return levels[-1][0], levels[-1][2], False
 
 
 def calculate_statistics(rmsd_data):
-    """Calculate basic statistics for RMSD data."""
+    """
+    Calculate basic statistics for RMSD data, the equilibration cut and the
+    statistics of the equilibrated (production) frames after it.
+    """
+    rmsd_data = np.asarray(rmsd_data, dtype=float)
     stats = {
         'mean': np.mean(rmsd_data),
         'std': np.std(rmsd_data),
@@ -116,13 +484,59 @@ def calculate_statistics(rmsd_data):
         'max': np.max(rmsd_data),
         'median': np.median(rmsd_data)
     }
+    
+    equil_frame, inefficiency, n_eff = detect_equilibration(rmsd_data)
+    production = rmsd_data[equil_frame:]
+    block_sem, block_size, block_plateau = block_average(production)
+    stats.update({
+        'equil_frame': equil_frame,
+        'inefficiency': inefficiency,
+        'n_eff': n_eff,
+        'prod_mean': np.mean(production),
+        'prod_std': np.std(production),
+        'block_sem': block_sem,
+        'block_size': block_size,
+        'block_plateau': block_plateau,
+        # Cross-check of the block average: std * sqrt(g / N)
+        'inefficiency_sem': np.std(production) * np.sqrt(inefficiency / len(production)),
+    })
     return stats
 
 
-def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit, total_time=None):
-    """Create and save RMSD time-series plot."""
+def decimate_series(time_data, rmsd_data, max_points):
+    """
+    Per-pixel min/max decimation of a long series before drawing.
+    The frames are split into max_points / 2 buckets, the lowest and the highest frame of
+    each bucket are kept in time order, so spikes stay visible. Returns the kept points.
+    """
+    n_frames = len(rmsd_data)
+    n_buckets = max(max_points // 2, 1)
+    if n_frames <= 2 * n_buckets + 2:
+        return time_data, rmsd_data
     
-    # Convert frame numbers to actual time if total_time is provided
+    starts = np.linspace(0, n_frames, n_buckets + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.append(starts, n_frames)))
+    keep = [np.array([0, n_frames - 1])]
+    for reduce in (np.minimum, np.maximum):
+        # The first frame of each bucket that reaches the bucket extreme
+        extreme = reduce.reduceat(rmsd_data, starts)
+        hits = np.flatnonzero(rmsd_data == extreme[bucket])
+        _, first = np.unique(bucket[hits], return_index=True)
+        keep.append(hits[first])
+    keep = np.unique(np.concatenate(keep))
+    return time_data[keep], rmsd_data[keep]
+
+
+def plot_points(fig, ax, dpi):
+    """Number of points worth drawing in an axes: two per pixel column of the saved figure."""
+    return int(2 * ax.get_position().width * fig.get_figwidth() * dpi)
+
+
+def frame_times(time_data, time_unit, total_time=None):
+    """
+    Convert frame numbers to actual time if total_time is provided.
+    Returns the x values, the x-axis label and the time range string.
+    """
     n_frames = len(time_data)
     if total_time is not None:
         # Calculate time per frame
@@ -138,23 +552,41 @@ def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit,
     else:
         x_label = 'Frame'
         time_range_str = f"Frame 0 - {n_frames - 1}"
+    return time_data, x_label, time_range_str
+
+
+def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit, total_time=None,
+                     decimate=True):
+    """
+    Create and save RMSD time-series plot.
+    With decimate, long series are drawn by decimate_series; statistics and the
+    histogram always use every frame.
+    """
+    load_pyplot()
+    
+    time_data, x_label, time_range_str = frame_times(time_data, time_unit, total_time)
     
     # Calculate statistics
     stats = calculate_statistics(rmsd_data)
     
     # Create figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5), 
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5),
                                     gridspec_kw={'width_ratios': [3, 1]})
     
     # Main RMSD time-series plot
-    ax1.plot(time_data, rmsd_data, color='#2E86AB', linewidth=0.8, alpha=0.9)
-    ax1.axhline(y=stats['mean'], color='#E94F37', linestyle='--', 
+    plot_time, plot_rmsd = time_data, rmsd_data
+    if decimate:
+        plot_time, plot_rmsd = decimate_series(time_data, rmsd_data, plot_points(fig, ax1, dpi))
+    ax1.plot(plot_time, plot_rmsd, color='#2E86AB', linewidth=0.8, alpha=0.9)
+    ax1.axhline(y=stats['mean'], color='#E94F37', linestyle='--',
                 linewidth=1.5, label=f"Mean: {stats['mean']:.3f} A")
-    ax1.fill_between(time_data, 
-                     stats['mean'] - stats['std'], 
+    ax1.fill_between(plot_time,
+                     stats['mean'] - stats['std'],
                      stats['mean'] + stats['std'],
-                     alpha=0.2, color='#E94F37', 
+                     alpha=0.2, color='#E94F37',
                      label=f"Std Dev: {stats['std']:.3f} A")
+    ax1.axvline(x=time_data[stats['equil_frame']], color='#6F2DBD', linestyle='-.',
+                linewidth=1.5, label=f"Equilibrated: {time_data[stats['equil_frame']]:.4g}")
     
     # Labels and formatting
     ax1.set_xlabel(x_label, fontsize=12)
@@ -165,10 +597,10 @@ def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit,
     ax1.set_xlim(time_data[0], time_data[-1])
     
     # RMSD distribution histogram
-    ax2.hist(rmsd_data, bins=50, orientation='horizontal', 
+    ax2.hist(rmsd_data, bins=50, orientation='horizontal',
              color='#2E86AB', alpha=0.7, edgecolor='black', linewidth=0.5)
     ax2.axhline(y=stats['mean'], color='#E94F37', linestyle='--', linewidth=1.5)
-    ax2.axhline(y=stats['median'], color='#28A745', linestyle=':', 
+    ax2.axhline(y=stats['median'], color='#28A745', linestyle=':',
                 linewidth=1.5, label=f"Median: {stats['median']:.3f} A")
     ax2.set_xlabel('Frequency', fontsize=12)
     ax2.set_ylabel('RMSD (Angstrom)', fontsize=12)
@@ -177,8 +609,8 @@ def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit,
     ax2.grid(True, alpha=0.3, linestyle='-')
     
     # Match y-axis limits
-    y_min = min(rmsd_data) - 0.1 * (max(rmsd_data) - min(rmsd_data))
-    y_max = max(rmsd_data) + 0.1 * (max(rmsd_data) - min(rmsd_data))
+    y_min = stats['min'] - 0.1 * (stats['max'] - stats['min'])
+    y_max = stats['max'] + 0.1 * (stats['max'] - stats['min'])
     ax1.set_ylim(y_min, y_max)
     ax2.set_ylim(y_min, y_max)
     
@@ -192,70 +624,326 @@ def create_rmsd_plot(time_data, rmsd_data, output_prefix, title, dpi, time_unit,
     return stats, time_range_str
 
 
+def create_overlay_plot(series, output_prefix, title, dpi, time_unit, total_time=None,
+                        decimate=True):
+    """Create and save one time-series plot with all series overlaid."""
+    load_pyplot()
+    
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5),
+                                    gridspec_kw={'width_ratios': [3, 1]})
+    
+    results = []
+    all_rmsd = np.concatenate([item['rmsd'] for item in series])
+    bins = np.histogram_bin_edges(all_rmsd, bins=50)
+    for i, item in enumerate(series):
+        color = SERIES_COLORS[i % len(SERIES_COLORS)]
+        time_data, x_label, time_range_str = frame_times(item['time'], time_unit, total_time)
+        stats = calculate_statistics(item['rmsd'])
+        results.append((item, stats, time_range_str))
+        
+        plot_time, plot_rmsd = time_data, item['rmsd']
+        if decimate:
+            plot_time, plot_rmsd = decimate_series(time_data, item['rmsd'], plot_points(fig, ax1, dpi))
+        ax1.plot(plot_time, plot_rmsd, color=color, linewidth=0.8, alpha=0.8,
+                 label=f"{item['label']} (mean {stats['mean']:.3f} A)")
+        ax1.axhline(y=stats['mean'], color=color, linestyle='--', linewidth=1.0)
+        ax1.axvline(x=time_data[stats['equil_frame']], color=color, linestyle='-.', linewidth=1.0)
+        ax2.hist(item['rmsd'], bins=bins, orientation='horizontal', histtype='step',
+                 color=color, linewidth=1.2)
+    
+    # Labels and formatting
+    ax1.set_xlabel(x_label, fontsize=12)
+    ax1.set_ylabel('RMSD (Angstrom)', fontsize=12)
+    ax1.set_title(title, fontsize=14, fontweight='bold')
+    ax1.legend(loc='upper right', fontsize=8)
+    ax1.grid(True, alpha=0.3, linestyle='-')
+    ax2.set_xlabel('Frequency', fontsize=12)
+    ax2.set_ylabel('RMSD (Angstrom)', fontsize=12)
+    ax2.set_title('Distribution', fontsize=14, fontweight='bold')
+    ax2.grid(True, alpha=0.3, linestyle='-')
+    
+    # Match y-axis limits
+    y_min = all_rmsd.min() - 0.1 * (all_rmsd.max() - all_rmsd.min())
+    y_max = all_rmsd.max() + 0.1 * (all_rmsd.max() - all_rmsd.min())
+    ax1.set_ylim(y_min, y_max)
+    ax2.set_ylim(y_min, y_max)
+    
+    plt.tight_layout()
+    
+    # Save figures
+    plt.savefig(f"{output_prefix}.png", dpi=dpi, bbox_inches='tight')
+    plt.savefig(f"{output_prefix}.pdf", bbox_inches='tight')
+    plt.close()
+    
+    return results
+
+
+def create_facet_plot(series, output_prefix, title, dpi, time_unit, total_time=None,
+                      decimate=True):
+    """Create and save one figure with a row of time-series and distribution panels per series."""
+    load_pyplot()
+    
+    n_rows = len(series)
+    fig, axes = plt.subplots(n_rows, 2, figsize=(14, 2.5 * n_rows + 1), squeeze=False,
+                             sharex='col', gridspec_kw={'width_ratios': [3, 1]})
+    
+    results = []
+    for i, item in enumerate(series):
+        ax1, ax2 = axes[i]
+        time_data, x_label, time_range_str = frame_times(item['time'], time_unit, total_time)
+        rmsd_data = item['rmsd']
+        stats = calculate_statistics(rmsd_data)
+        results.append((item, stats, time_range_str))
+        
+        plot_time, plot_rmsd = time_data, rmsd_data
+        if decimate:
+            plot_time, plot_rmsd = decimate_series(time_data, rmsd_data, plot_points(fig, ax1, dpi))
+        ax1.plot(plot_time, plot_rmsd, color='#2E86AB', linewidth=0.8, alpha=0.9)
+        ax1.axhline(y=stats['mean'], color='#E94F37', linestyle='--',
+                    linewidth=1.5, label=f"Mean: {stats['mean']:.3f} A")
+        ax1.fill_between(plot_time,
+                         stats['mean'] - stats['std'],
+                         stats['mean'] + stats['std'],
+                         alpha=0.2, color='#E94F37',
+                         label=f"Std Dev: {stats['std']:.3f} A")
+        ax1.axvline(x=time_data[stats['equil_frame']], color='#6F2DBD', linestyle='-.',
+                    linewidth=1.5, label=f"Equilibrated: {time_data[stats['equil_frame']]:.4g}")
+        ax1.set_ylabel('RMSD (A)', fontsize=10)
+        ax1.set_title(item['label'], fontsize=11, loc='left')
+        ax1.legend(loc='upper right', fontsize=8)
+        ax1.grid(True, alpha=0.3, linestyle='-')
+        
+        ax2.hist(rmsd_data, bins=50, orientation='horizontal',
+                 color='#2E86AB', alpha=0.7, edgecolor='black', linewidth=0.5)
+        ax2.axhline(y=stats['mean'], color='#E94F37', linestyle='--', linewidth=1.5)
+        ax2.axhline(y=stats['median'], color='#28A745', linestyle=':', linewidth=1.5)
+        ax2.grid(True, alpha=0.3, linestyle='-')
+        
+        # Match y-axis limits
+        y_min = rmsd_data.min() - 0.1 * (rmsd_data.max() - rmsd_data.min())
+        y_max = rmsd_data.max() + 0.1 * (rmsd_data.max() - rmsd_data.min())
+        ax1.set_ylim(y_min, y_max)
+        ax2.set_ylim(y_min, y_max)
+    
+    axes[-1][0].set_xlabel(x_label, fontsize=12)
+    axes[-1][1].set_xlabel('Frequency', fontsize=12)
+    axes[0][1].set_title('Distribution', fontsize=11)
+    fig.suptitle(title, fontsize=14, fontweight='bold')
+    
+    plt.tight_layout()
+    
+    # Save figures
+    plt.savefig(f"{output_prefix}.png", dpi=dpi, bbox_inches='tight')
+    plt.savefig(f"{output_prefix}.pdf", bbox_inches='tight')
+    plt.close()
+    
+    return results
+
+
+def _separate_plot_job(item, output_prefix, title, dpi, time_unit, total_time, decimate=True):
+    """Draw one series of --layout separate, in a worker process."""
+    stats, time_range_str = create_rmsd_plot(
+        item['time'], item['rmsd'], output_prefix,
+        item.get('title', f"{title} - {item['label']}"), dpi, time_unit, total_time, decimate
+    )
+    return stats, time_range_str
+
+
+def format_statistics(stats, n_frames, time_range_str, total_time=None):
+    """Format the statistics of one series as the lines of the summary file."""
+    lines = [f"Number of frames: {n_frames}\n"]
+    if total_time is not None:
+        lines.append(f"Total simulation time: {total_time} ns\n")
+        time_per_frame = total_time / (n_frames - 1) if n_frames > 1 else total_time
+        lines.append(f"Time per frame: {time_per_frame:.4f} ns ({time_per_frame * 1000:.2f} ps)\n")
+    lines.append(f"Time range: {time_range_str}\n\n")
+    lines.append("RMSD Statistics (Angstrom):\n")
+    lines.append("-" * 30 + "\n")
+    lines.append(f"  Mean:     {stats['mean']:.4f}\n")
+    lines.append(f"  Std Dev:  {stats['std']:.4f}\n")
+    lines.append(f"  Median:   {stats['median']:.4f}\n")
+    lines.append(f"  Min:      {stats['min']:.4f}\n")
+    lines.append(f"  Max:      {stats['max']:.4f}\n")
+    lines.append(f"  Range:    {stats['max'] - stats['min']:.4f}\n\n")
+    
+    # Frames before the cut are the equilibration ramp, the rest is production
+    equil_frame = stats['equil_frame']
+    equil_str = f"frame {equil_frame}"
+    if total_time is not None:
+        time_per_frame = total_time / (n_frames - 1) if n_frames > 1 else total_time
+        equil_str += f" ({equil_frame * time_per_frame:.2f} ns)"
+    lines.append("Equilibration (maximum effective sample size):\n")
+    lines.append("-" * 30 + "\n")
+    lines.append(f"  Equilibrated from:         {equil_str}\n")
+    lines.append(f"  Production frames:         {n_frames - equil_frame}\n")
+    lines.append(f"  Statistical inefficiency:  {stats['inefficiency']:.2f}\n")
+    lines.append(f"  Effective samples:         {stats['n_eff']:.1f}\n")
+    lines.append(f"  Production mean:           {stats['prod_mean']:.4f}\n")
+    lines.append(f"  Production std dev:        {stats['prod_std']:.4f}\n")
+    plateau = '' if stats['block_plateau'] else ', no plateau: lower bound'
+    lines.append(f"  Block-averaged SEM:        {stats['block_sem']:.4f} "
+                 f"(blocks of {stats['block_size']} frames{plateau})\n")
+    lines.append(f"  SEM from inefficiency:     {stats['inefficiency_sem']:.4f}\n")
+    return lines
+
+
 def write_statistics(output_prefix, stats, n_frames, time_range_str, total_time=None):
     """Write statistics to a summary file."""
     with open(f"{output_prefix}_statistics.txt", 'w') as f:
         f.write("RMSD Analysis Statistics\n")
         f.write("=" * 40 + "\n\n")
-        f.write(f"Number of frames: {n_frames}\n")
-        if total_time is not None:
-            f.write(f"Total simulation time: {total_time} ns\n")
-            time_per_frame = total_time / (n_frames - 1) if n_frames > 1 else total_time
-            f.write(f"Time per frame: {time_per_frame:.4f} ns ({time_per_frame * 1000:.2f} ps)\n")
-        f.write(f"Time range: {time_range_str}\n\n")
-        f.write("RMSD Statistics (Angstrom):\n")
-        f.write("-" * 30 + "\n")
-        f.write(f"  Mean:     {stats['mean']:.4f}\n")
-        f.write(f"  Std Dev:  {stats['std']:.4f}\n")
-        f.write(f"  Median:   {stats['median']:.4f}\n")
-        f.write(f"  Min:      {stats['min']:.4f}\n")
-        f.write(f"  Max:      {stats['max']:.4f}\n")
-        f.write(f"  Range:    {stats['max'] - stats['min']:.4f}\n")
+        f.writelines(format_statistics(stats, n_frames, time_range_str, total_time))
+
+
+def write_series_statistics(output_prefix, results, total_time=None):
+    """Write the statistics of several series to one summary file."""
+    with open(f"{output_prefix}_statistics.txt", 'w') as f:
+        f.write("RMSD Analysis Statistics\n")
+        f.write("=" * 40 + "\n")
+        for item, stats, time_range_str in results:
+            f.write(f"\nSeries: {item['label']} ({item['file']})\n")
+            f.writelines(format_statistics(stats, len(item['rmsd']), time_range_str, total_time))
+
+
+def statistics_record(item, stats, time_range_str, total_time=None):
+    """Flatten the statistics of one series into a record for write_records."""
+    n_frames = len(item['rmsd'])
+    record = {
+        'input': os.path.abspath(item['file']),
+        'series': item['label'],
+        'n_frames': n_frames,
+        'total_time_ns': total_time,
+        'time_range': time_range_str,
+    }
+    record.update({key: stats[key] for key in ('mean', 'std', 'median', 'min', 'max')})
+    record['equil_frame'] = stats['equil_frame']
+    if total_time is not None:
+        time_per_frame = total_time / (n_frames - 1) if n_frames > 1 else total_time
+        record['equil_time_ns'] = stats['equil_frame'] * time_per_frame
+    record['production_frames'] = n_frames - stats['equil_frame']
+    record.update({key: stats[key] for key in ('inefficiency', 'n_eff', 'prod_mean', 'prod_std',
+                                                'block_sem', 'block_size', 'block_plateau',
+                                                'inefficiency_sem')})
+    if 'title' in item:
+        record['title'] = item['title']
+    return record
+
+
+def print_statistics(label, stats):
+    """Print the statistics of one series."""
+    print(f"\nRMSD Statistics{f' ({label})' if label else ''}:")
+    print(f"  Mean:   {stats['mean']:.4f} A")
+    print(f"  Std:    {stats['std']:.4f} A")
+    print(f"  Min:    {stats['min']:.4f} A")
+    print(f"  Max:    {stats['max']:.4f} A")
+    print(f"  Equilibrated from frame {stats['equil_frame']}, "
+          f"production mean {stats['prod_mean']:.4f} +/- {stats['block_sem']:.4f} A (block SEM)")
+
+
+def safe_label(label):
+    """Turn a series label into a file name part."""
+    return re.sub(r'[^\w.-]+', '_', label).strip('_')
 
 
 def main():
+    start_time = time.perf_counter()
     args = parse_args()
     
-    # Check if input file exists
-    if not os.path.exists(args.file):
-        print(f"ERROR: Input file not found: {args.file}")
+    # Check if input files exist
+    for filename in args.file:
+        if not os.path.exists(filename):
+            print(f"ERROR: Input file not found: {filename}")
+            sys.exit(1)
+    if args.jobs < 1:
+        print("ERROR: --jobs should be a positive integer.")
         sys.exit(1)
+    if args.stats_format is not None:
+        check_stats_format(args.stats_format)
     
-    print(f"Reading RMSD data from: {args.file}")
-    time_data, rmsd_data = read_csv_data(args.file)
+    for filename in args.file:
+        print(f"Reading RMSD data from: {filename}")
+    series = collect_series(args.file, args.labels, args.cache, args.columns, args.titles)
     
-    if len(rmsd_data) == 0:
-        print("ERROR: No valid data found in input file.")
-        sys.exit(1)
+    for item in series:
+        if len(item['rmsd']) == 0:
+            print(f"ERROR: No valid data found in input file {item['file']}.")
+            sys.exit(1)
     
-    n_frames = len(rmsd_data)
-    print(f"Found {n_frames} data points")
+    n_frames = len(series[0]['rmsd'])
+    if len(series) == 1:
+        print(f"Found {n_frames} data points")
+    else:
+        print(f"Found {len(series)} series, {n_frames} data points in the first one")
     
     if args.total_time:
         time_per_frame = args.total_time / (n_frames - 1) if n_frames > 1 else args.total_time
         print(f"Total simulation time: {args.total_time} ns")
         print(f"Time per frame: {time_per_frame:.4f} ns ({time_per_frame * 1000:.2f} ps)")
     
-    print(f"Generating plot: {args.output}.png")
-    
-    stats, time_range_str = create_rmsd_plot(
-        time_data, rmsd_data, 
-        args.output, args.title, 
-        args.dpi, args.time_unit,
-        args.total_time
-    )
+    outputs = [args.output]
+    if len(series) == 1:
+        # A single series keeps the original two-panel plot and summary
+        print(f"Generating plot: {args.output}.png")
+        
+        stats, time_range_str = create_rmsd_plot(
+            series[0]['time'], series[0]['rmsd'],
+            args.output, args.title,
+            args.dpi, args.time_unit,
+            args.total_time, not args.no_decimate
+        )
+        
+        write_statistics(args.output, stats, n_frames, time_range_str, args.total_time)
+        print_statistics(None, stats)
+        records = {args.output: [(series[0], stats, time_range_str)]}
+    elif args.layout == 'separate':
+        # Independent figures, drawn by a pool of --jobs processes
+        outputs = [f"{args.output}_{safe_label(item['label'])}" for item in series]
+        if len(set(outputs)) != len(outputs):
+            print("ERROR: Series labels are not unique, set them with --labels.")
+            sys.exit(1)
+        jobs = [(item, output, args.title, args.dpi, args.time_unit, args.total_time,
+                 not args.no_decimate)
+                for item, output in zip(series, outputs)]
+        print(f"Generating {len(jobs)} plots: {args.output}_<label>.png")
+        if args.jobs > 1:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(jobs))) as executor:
+                results = list(executor.map(_separate_plot_job, *zip(*jobs)))
+        else:
+            results = [_separate_plot_job(*job) for job in jobs]
+        
+        records = {}
+        for item, output, (stats, time_range_str) in zip(series, outputs, results):
+            write_statistics(output, stats, len(item['rmsd']), time_range_str, args.total_time)
+            print_statistics(item['label'], stats)
+            records[output] = [(item, stats, time_range_str)]
+    else:
+        print(f"Generating {args.layout} plot of {len(series)} series: {args.output}.png")
+        create_plot = create_overlay_plot if args.layout == 'overlay' else create_facet_plot
+        results = create_plot(
+            series, args.output, args.title,
+            args.dpi, args.time_unit, args.total_time, not args.no_decimate
+        )
+        
+        write_series_statistics(args.output, results, args.total_time)
+        for item, stats, time_range_str in results:
+            print_statistics(item['label'], stats)
+        records = {args.output: results}
     
-    write_statistics(args.output, stats, n_frames, time_range_str, args.total_time)
+    if args.stats_format is not None:
+        print(f"\nWriting {args.stats_format} statistics records:")
+        metadata = run_metadata('rmsd_plot', start_time, title=args.title, layout=args.layout)
+        for output, results in records.items():
+            rows = [dict(metadata, output=output, **statistics_record(item, stats, time_range_str, args.total_time))
+                    for item, stats, time_range_str in results]
+            write_records(rows, stats_filename(output, args.stats_format), args.stats_format)
     
-    print(f"\nRMSD Statistics:")
-    print(f"  Mean:   {stats['mean']:.4f} A")
-    print(f"  Std:    {stats['std']:.4f} A")
-    print(f"  Min:    {stats['min']:.4f} A")
-    print(f"  Max:    {stats['max']:.4f} A")
     print(f"\nOutput files:")
-    print(f"  {args.output}.png")
-    print(f"  {args.output}.pdf")
-    print(f"  {args.output}_statistics.txt")
+    for output in outputs:
+        print(f"  {output}.png")
+        print(f"  {output}.pdf")
+        print(f"  {output}_statistics.txt")
+        if args.stats_format is not None:
+            print(f"  {stats_filename(output, args.stats_format)}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+stats_merge.py - Structured statistics records for AutoTRJ
+Part of AutoMD: https://github.com/Wang-Lin-boop/AutoMD
+
+rmsd_plot.py and hbond_analysis.py write one record per series or H-bond pair to
+<prefix>_statistics.<json|csv|parquet> with --stats-format. Every record carries
+the tool, the input paths, the frame count and the run time. This script walks a
+directory tree once and merges all such records into one table, with the record
+file of each row in the "source" column.
+
+Usage:
+    python stats_merge.py <directory> [<directory> ...] -o <merged.csv|.json|.parquet> [--tool rmsd_plot]
+
+Author: AutoMD Development Team
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+
+STATS_FORMATS = ['json', 'csv', 'parquet']
+STATS_SUFFIX = '_statistics'
+
+
+def stats_filename(output_prefix, stats_format):
+    """Record file of an output prefix, e.g. job_RMSD_statistics.json."""
+    return f"{output_prefix}{STATS_SUFFIX}.{stats_format}"
+
+
+def check_stats_format(stats_format):
+    """Exit early if the packages to write stats_format are missing, before a long run."""
+    if stats_format != 'parquet':
+        return
+    try:
+        import pandas
+    except ImportError:
+        print("ERROR: pandas is required for --stats-format parquet.")
+        sys.exit(1)
+    try:
+        import pyarrow
+    except ImportError:
+        try:
+            import fastparquet
+        except ImportError:
+            print("ERROR: pyarrow or fastparquet is required for --stats-format parquet.")
+            sys.exit(1)
+
+
+def run_metadata(tool, start_time, **fields):
+    """
+    Common fields of the records of one run: the tool, its inputs (given as fields),
+    the wall time since start_time (time.perf_counter) and the date of the run.
+    """
+    metadata = {'tool': tool}
+    metadata.update(fields)
+    metadata['elapsed_s'] = round(time.perf_counter() - start_time, 3)
+    metadata['date'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    return metadata
+
+
+def plain_value(value):
+    """Turn numpy scalars into Python numbers and NaN into None."""
+    if hasattr(value, 'item'):
+        # float32 through its shortest repr, so 2.9 is not written as 2.9000000953674316
+        dtype = getattr(value, 'dtype', None)
+        value = float(str(value)) if dtype is not None and dtype.kind == 'f' and dtype.itemsize < 8 else value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def write_records(records, filename, stats_format):
+    """Write a list of flat dicts as a JSON list, a CSV table or a parquet file."""
+    records = [{key: plain_value(value) for key, value in record.items()} for record in records]
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    if stats_format == 'json':
+        with open(filename, 'w') as f:
+            json.dump(records, f, indent=1)
+            f.write('\n')
+    elif stats_format == 'csv':
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(records)
+    elif stats_format == 'parquet':
+        import pandas as pd
+        pd.DataFrame(records, columns=columns).to_parquet(filename, index=False)
+    else:
+        raise ValueError(f"unknown stats format: {stats_format}")
+    print(f"  Written: {filename}")
+
+
+def read_records(filename):
+    """Read the records of one file written by write_records, as a list of dicts."""
+    stats_format = os.path.splitext(filename)[1].lstrip('.')
+    if stats_format == 'json':
+        with open(filename, 'r') as f:
+            records = json.load(f)
+        return records if isinstance(records, list) else [records]
+    if stats_format == 'csv':
+        with open(filename, 'r', newline='') as f:
+            return [{key: parse_field(value) for key, value in row.items()} for row in csv.DictReader(f)]
+    if stats_format == 'parquet':
+        import pandas as pd
+        frame = pd.read_parquet(filename)
+        return frame.astype(object).where(frame.notna(), None).to_dict('records')
+    raise ValueError(f"unknown stats format: {stats_format}")
+
+
+def parse_field(text):
+    """Numbers of a CSV record back to int/float, empty fields to None."""
+    if text is None or text == '':
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def find_record_files(directories, exclude=()):
+    """Walk the directory trees once and yield every *_statistics.<json|csv|parquet> file."""
+    exclude = {os.path.abspath(path) for path in exclude}
+    suffixes = tuple(f"{STATS_SUFFIX}.{stats_format}" for stats_format in STATS_FORMATS)
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.endswith(suffixes) and os.path.abspath(path) not in exclude:
+                    yield path
+
+
+def merge_records(directories, tool=None, exclude=()):
+    """
+    Collect the records of every record file below directories in one pass.
+    Files without a "tool" field (e.g. an input CSV that happens to match the name)
+    are skipped. Returns the records, each with its "source" file.
+    """
+    merged = []
+    for path in find_record_files(directories, exclude):
+        try:
+            records = read_records(path)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"WARNING: Skipping unreadable {path}: {e}")
+            continue
+        if not records or not all(isinstance(record, dict) and 'tool' in record for record in records):
+            print(f"WARNING: Skipping {path}, not a statistics record file.")
+            continue
+        for record in records:
+            if tool is None or record['tool'] == tool:
+                record['source'] = path
+                merged.append(record)
+    return merged
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Merge the statistics records of rmsd_plot.py and hbond_analysis.py into one table'
+    )
+    parser.add_argument(
+        'directories',
+        nargs='+',
+        help='Directory trees searched for *_statistics.json/.csv/.parquet record files'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        required=True,
+        help='Merged table, the format follows the extension (.json, .csv or .parquet)'
+    )
+    parser.add_argument(
+        '--tool',
+        choices=['rmsd_plot', 'hbond_analysis'],
+        default=None,
+        help='Only merge the records of one tool (default: all)'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    stats_format = os.path.splitext(args.output)[1].lstrip('.')
+    if stats_format not in STATS_FORMATS:
+        print(f"ERROR: The output should end with .json, .csv or .parquet: {args.output}")
+        sys.exit(1)
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            print(f"ERROR: Directory not found: {directory}")
+            sys.exit(1)
+    check_stats_format(stats_format)
+
+    records = merge_records(args.directories, args.tool, exclude=[args.output])
+    if not records:
+        print("ERROR: No statistics records found.")
+        sys.exit(1)
+    n_sources = len({record['source'] for record in records})
+    print(f"Merged {len(records)} records from {n_sources} files")
+    write_records(records, args.output, stats_format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rmsd_plot
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_trailing_delimiter(tmp_path, header):
+    """Rows ending in the delimiter are read in full, with or without a header."""
+    lines = ['Time,RMSD,'] if header else []
+    lines += [f"{i * 0.1:.1f},{1.0 + i * 0.01:.3f}," for i in range(100)]
+    filename = tmp_path / 'rmsd.csv'
+    filename.write_text('\n'.join(lines) + '\n')
+
+    assert rmsd_plot.sniff_csv_format(str(filename)) == (',', header)
+    time_data, rmsd_data, names = rmsd_plot.read_csv_data(str(filename))
+    assert len(time_data) == 100
+    assert rmsd_data.shape == (100, 1)
+    np.testing.assert_allclose(rmsd_data[:, 0], 1.0 + np.arange(100) * 0.01)
+    assert names == (['RMSD'] if header else ['RMSD_1'])
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_trailing_delimiter_line_parser(header):
+    """The line-by-line reader used without pandas agrees."""
+    lines = ['Time,RMSD,'] if header else []
+    lines += ['0.0,1.234,', '0.1,1.250,']
+    matrix, names = rmsd_plot.parse_csv_lines('\n'.join(lines).encode(), ',', header)
+    np.testing.assert_allclose(matrix, [[0.0, 1.234], [0.1, 1.25]])
+    assert names == (['Time', 'RMSD'] if header else [])
+
+
+def test_unwritable_cache(tmp_path, monkeypatch):
+    """A cache that cannot be written does not stop the plot."""
+    filename = tmp_path / 'rmsd.csv'
+    filename.write_text(''.join(f"{i * 0.1:.1f},{1.0 + i * 0.01:.3f}\n" for i in range(10)))
+
+    def fail(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(rmsd_plot.os, 'replace', fail)
+    time_data, rmsd_data, names = rmsd_plot.read_csv_data(str(filename), cache=True)
+    assert rmsd_data.shape == (10, 1)
+    assert sorted(os.listdir(tmp_path)) == ['rmsd.csv']
@@ -4,15 +4,21 @@
 ## edited date : 20221215
 
 import os
+import glob
 import math
+import shutil
 import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 import numpy as np
-from scipy.interpolate import interp2d
-import scipy.ndimage as ndimage
-from scipy.ndimage import gaussian_filter
-import matplotlib.pyplot as plt
-from matplotlib.ticker import AutoLocator, FormatStrFormatter
-from matplotlib import pylab as pylab
+
+## matplotlib and scipy are imported by load_plotting(), only when drawing,
+## so -e and -g start without them
+plt = None
+ndimage = gaussian_filter = None
+AutoLocator = FormatStrFormatter = None
 
 myparams = {
     "axes.labelsize": "10",
@@ -33,11 +39,292 @@ myparams = {
     "figure.dpi": 600,
     "savefig.dpi": 600,
 }
-pylab.rcParams.update(myparams)
 
 
-def readxpm(inputfile: str) -> tuple:
-    """read xpm file and return all infos"""
+def load_plotting() -> None:
+    """import matplotlib and scipy.ndimage, and apply myparams"""
+
+    global plt, ndimage, gaussian_filter, AutoLocator, FormatStrFormatter
+    if plt != None:
+        return
+    import scipy.ndimage as ndimage
+    from scipy.ndimage import gaussian_filter
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import AutoLocator, FormatStrFormatter
+
+    plt.rcParams.update(myparams)
+
+
+def note_to_value(note: str) -> float:
+    """convert the note of a color into a float, nan for non-numeric notes (Discrete xpm)"""
+    try:
+        return float(note)
+    except ValueError:
+        return np.nan
+
+
+def decode_xpm_pixels(xpm_data: list, chars: list, xpm_char_per_pixel: int) -> np.ndarray:
+    """decode the pixel rows of xpm into a (height, width) matrix of color indices
+    xpm_data: the pixel rows (strings) of xpm file
+    chars: the color codes, the decoded index of a pixel is its position in chars
+    xpm_char_per_pixel: the number of chars of one color code
+    """
+
+    ## view all rows as one (height, width) array of fixed-width byte strings,
+    ## turn every code into one integer and look them up in the sorted color codes
+    pixels = np.frombuffer(
+        "".join(xpm_data).encode("latin-1"), dtype=np.uint8
+    ).reshape(len(xpm_data), -1, xpm_char_per_pixel)
+    weights = 256 ** np.arange(xpm_char_per_pixel - 1, -1, -1, dtype=np.int64)
+    pixel_codes = pixels.astype(np.int64) @ weights
+    char_codes = np.array(
+        [sum(ord(c) * int(w) for c, w in zip(char, weights)) for char in chars],
+        dtype=np.int64,
+    )
+    ## stable sort keeps the first one of duplicated codes, the same as chars.index()
+    order = np.argsort(char_codes, kind="stable")
+    position = np.searchsorted(char_codes[order], pixel_codes)
+    position = np.minimum(position, len(chars) - 1)
+    if not np.all(char_codes[order][position] == pixel_codes):
+        print("ERROR -> some pixels use chars which are not defined in the colors of xpm")
+        exit()
+    return order[position]
+
+
+@dataclass(eq=False)
+class XpmMap:
+    """all infos of a xpm file
+    pixels are kept as the raw rows (data) and only decoded on the first access of
+    index (color index of every pixel) or values (float note of every pixel, nan if
+    the note is not a number); both are (height, width) arrays, top row first
+    """
+
+    __slots__ = (
+        "path",
+        "title",
+        "legend",
+        "type",
+        "xlabel",
+        "ylabel",
+        "width",
+        "height",
+        "color_num",
+        "char_per_pixel",
+        "chars",
+        "colors",
+        "notes",
+        "colors_rgb",
+        "xaxis",
+        "yaxis",
+        "data",
+        "_index",
+        "_values",
+    )
+    path: str
+    title: str
+    legend: str
+    type: str
+    xlabel: str
+    ylabel: str
+    width: int
+    height: int
+    color_num: int
+    char_per_pixel: int
+    chars: list
+    colors: list
+    notes: list
+    colors_rgb: list
+    xaxis: list
+    yaxis: list
+    data: list
+
+    def __post_init__(self):
+        self._index = None
+        self._values = None
+
+    @property
+    def index(self) -> np.ndarray:
+        if self._index is None:
+            self._index = decode_xpm_pixels(self.data, self.chars, self.char_per_pixel)
+        return self._index
+
+    @property
+    def values(self) -> np.ndarray:
+        if self._values is None:
+            self._values = np.array([note_to_value(note) for note in self.notes])[self.index]
+        return self._values
+
+    def save_npz(self, npzfile: str, mtime: int) -> None:
+        """save infos and decoded pixels, mtime is the st_mtime_ns of the source xpm"""
+        np.savez(
+            npzfile,
+            mtime=mtime,
+            infos=np.array(
+                [self.title, self.legend, self.type, self.xlabel, self.ylabel]
+            ),
+            shape=np.array(
+                [self.width, self.height, self.color_num, self.char_per_pixel]
+            ),
+            chars=np.array(self.chars),
+            colors=np.array(self.colors),
+            notes=np.array(self.notes),
+            xaxis=np.array(self.xaxis, dtype=float),
+            yaxis=np.array(self.yaxis, dtype=float),
+            index=self.index,
+        )
+
+    @classmethod
+    def from_values(
+        cls,
+        values: np.ndarray,
+        xaxis: list,
+        yaxis: list,
+        title: str,
+        legend: str,
+        xlabel: str,
+        ylabel: str,
+        color_num: int = 100,
+        path: str = "",
+    ):
+        """build a Continuous xpm from a (height, width) value matrix, like gmx sham
+        values: rows follow yaxis, from the lowest y (bottom of the figure) up
+        the exact values are kept, the color index quantizes them into color_num levels
+        """
+        values = np.asarray(values, dtype=float)
+        height, width = values.shape
+        vmin, vmax = float(values.min()), float(values.max())
+        span = vmax - vmin if vmax > vmin else 1.0
+        ## printable chars without " and \
+        alphabet = [chr(c) for c in range(35, 127) if chr(c) != "\\"]
+        char_per_pixel = 1 if color_num <= len(alphabet) else 2
+        if char_per_pixel == 1:
+            chars = alphabet[:color_num]
+        else:
+            chars = [a + b for a in alphabet for b in alphabet][:color_num]
+        ## white for the lowest level to black for the highest
+        shades = [255 - round(255 * i / max(color_num - 1, 1)) for i in range(color_num)]
+        colors = ["#{:02X}{:02X}{:02X}".format(c, c, c) for c in shades]
+        notes = ["{:.3g}".format(vmin + span * i / color_num) for i in range(color_num)]
+        xpm = cls(
+            path,
+            title,
+            legend,
+            "Continuous",
+            xlabel,
+            ylabel,
+            width,
+            height,
+            color_num,
+            char_per_pixel,
+            chars,
+            colors,
+            notes,
+            [[c, c, c] for c in shades],
+            [float(x) for x in xaxis],
+            [float(y) for y in yaxis],
+            None,
+        )
+        ## top row first, as decoded from a xpm file
+        levels = ((values[::-1] - vmin) / span * color_num).astype(int)
+        xpm._index = np.minimum(levels, color_num - 1)
+        xpm._values = values[::-1].copy()
+        return xpm
+
+    @classmethod
+    def load_npz(cls, npzfile: str, path: str, mtime: int):
+        """load the xpm saved by save_npz, None if it is missing or out of date"""
+        if not os.path.exists(npzfile):
+            return None
+        try:
+            with np.load(npzfile, allow_pickle=False) as npz:
+                if int(npz["mtime"]) != mtime:
+                    return None
+                colors = npz["colors"].tolist()
+                xpm = cls(
+                    path,
+                    *npz["infos"].tolist(),
+                    *[int(n) for n in npz["shape"]],
+                    npz["chars"].tolist(),
+                    colors,
+                    npz["notes"].tolist(),
+                    [[int(c[i : i + 2], 16) for i in (1, 3, 5)] for c in colors],
+                    npz["xaxis"].tolist(),
+                    npz["yaxis"].tolist(),
+                    None,
+                )
+                xpm._index = npz["index"]
+        except (OSError, KeyError, ValueError) as e:
+            print("Warning -> ignore broken cache {} : {}".format(npzfile, e))
+            return None
+        return xpm
+
+
+## parsed xpm files of this process : abspath -> (mtime, XpmMap)
+_xpm_cache = {}
+
+
+def readxpm(inputfile: str, npz_cache: bool = False, process_cache: bool = True) -> XpmMap:
+    """read xpm file and return all infos as XpmMap
+    a file is parsed once per process (until it is modified), so several figures
+    of the same xpm share one XpmMap; a XpmMap (e.g. from XpmMap.from_values) is
+    returned as it is
+    npz_cache: also keep the decoded xpm in inputfile.npz and reuse it in later runs
+    process_cache: keep the XpmMap for later calls, False for maps read only once
+    """
+
+    if isinstance(inputfile, XpmMap):
+        return inputfile
+    ## check xpm file
+    if not os.path.exists(inputfile):
+        print("ERROR -> no {} in current directory".format(inputfile))
+        exit()
+    key = os.path.abspath(inputfile)
+    mtime = os.stat(inputfile).st_mtime_ns
+    if process_cache == True and key in _xpm_cache and _xpm_cache[key][0] == mtime:
+        return _xpm_cache[key][1]
+
+    npzfile = inputfile + ".npz"
+    xpm = XpmMap.load_npz(npzfile, inputfile, mtime) if npz_cache else None
+    if xpm is not None:
+        print("Info -> decoded data has been loaded from {}".format(npzfile))
+    else:
+        xpm = parsexpm(inputfile)
+        if npz_cache:
+            xpm.save_npz(npzfile, mtime)
+            print("Info -> decoded data has been saved into {}".format(npzfile))
+    if process_cache == True:
+        _xpm_cache[key] = (mtime, xpm)
+    return xpm
+
+
+def writexpm(xpm: XpmMap, outputfile: str) -> None:
+    """write XpmMap into a xpm file in the layout of gmx"""
+
+    codes = np.array(xpm.chars)
+    lines = [
+        "/* XPM */",
+        '/* title:   "{}" */'.format(xpm.title),
+        '/* legend:  "{}" */'.format(xpm.legend),
+        '/* x-label: "{}" */'.format(xpm.xlabel),
+        '/* y-label: "{}" */'.format(xpm.ylabel),
+        '/* type:    "{}" */'.format(xpm.type),
+        "static char *gromacs_xpm[] = {",
+        '"{} {}   {} {}",'.format(xpm.width, xpm.height, xpm.color_num, xpm.char_per_pixel),
+    ]
+    for char, color, note in zip(xpm.chars, xpm.colors, xpm.notes):
+        lines.append('"{}  c {} " /* "{}" */,'.format(char, color, note))
+    ## gmx writes at most 80 axis values per comment line
+    for label, axis in (("x-axis", xpm.xaxis), ("y-axis", xpm.yaxis)):
+        for start in range(0, len(axis), 80):
+            lines.append("/* {}:  {} */".format(label, " ".join("{:g}".format(v) for v in axis[start : start + 80])))
+    lines += ['"{}",'.format("".join(row)) for row in codes[xpm.index]]
+    lines.append("};")
+    with open(outputfile, "w") as fo:
+        fo.write("\n".join(lines) + "\n")
+
+
+def parsexpm(inputfile: str) -> XpmMap:
+    """parse xpm file and return all infos, pixels are decoded lazily by XpmMap"""
 
     xpm_title, xpm_legend, xpm_type = "", "", ""
     xpm_xlabel, xpm_ylabel = "", ""
@@ -168,7 +455,8 @@ def readxpm(inputfile: str) -> tuple:
 
     print("Info -> all data has been read from {} successfully.".format(inputfile))
 
-    xpm_infos = (
+    return XpmMap(
+        inputfile,
         xpm_title,
         xpm_legend,
         xpm_type,
@@ -186,76 +474,59 @@ def readxpm(inputfile: str) -> tuple:
         xpm_yaxis,
         xpm_data,
     )
-    return xpm_infos
+
+
+def origin_image(xpm: XpmMap, IP: bool) -> np.ndarray:
+    """decode the whole xpm into the image of drawxpm_origin and smooth it once
+    xpm: the return of readxpm()
+    IP : False for the (height, width, 3) rgb image, True for the (height, width) values
+    """
+
+    load_plotting()
+
+    if IP == False:
+        img = np.array(xpm.colors_rgb, dtype=np.uint8)[xpm.index]
+        ## smooth along the two pixel axes only, never across the r, g, b channels
+        return ndimage.gaussian_filter(img, sigma=(0.3, 0.3, 0))
+    return ndimage.gaussian_filter(xpm.values, sigma=0.3)
 
 
 def drawxpm_origin(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
     """draw xpm figure by plt.imshow
-    xpmfile: input xpm file
+    xpmfile: input xpm file, or a XpmMap
     IP : whether to interpolation
     outputpng: the name for figure output
     noshow: whether not to show figure, useful for PC without gui
     """
 
+    load_plotting()
+
     ## check parameters
-    if not os.path.exists(xpmfile):
+    if isinstance(xpmfile, str) and not os.path.exists(xpmfile):
         print("ERROR -> {} not in current directory".format(xpmfile))
         exit()
     if outputpng != None and os.path.exists(outputpng):
         print("ERROR -> {} already in current directory".format(outputpng))
         exit()
 
-    (
-        xpm_title,
-        xpm_legend,
-        xpm_type,
-        xpm_xlabel,
-        xpm_ylabel,
-        xpm_width,
-        xpm_height,
-        xpm_color_num,
-        xpm_char_per_pixel,
-        chars,
-        colors,
-        notes,
-        colors_rgb,
-        xpm_xaxis,
-        xpm_yaxis,
-        xpm_data,
-    ) = readxpm(xpmfile)
+    xpm = readxpm(xpmfile)
 
     ## the read order of pixels is from top to bottom
     ## but the y-axis is from bottom to top, so reverse() is important !
-    xpm_yaxis.reverse()
+    ## (reverse a copy, the XpmMap may be shared through the parse cache)
+    xpm_xaxis, xpm_yaxis = xpm.xaxis, xpm.yaxis[::-1]
 
     # visualization of xpm
     if IP == False:
-        img = []
-        for line in xpm_data:
-            rgb_line = []
-            for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-                rgb_line.append(
-                    colors_rgb[chars.index(line[i : i + xpm_char_per_pixel])]
-                )
-            img.append(rgb_line)
-            img = ndimage.gaussian_filter(img,sigma=0.3)
-
+        img = origin_image(xpm, IP)
         plt.imshow(img, aspect="auto")
 
     if IP == True:
-        if xpm_type != "Continuous":
+        if xpm.type != "Continuous":
             print("ERROR -> Only Continuous type xpm file can interpolation")
             exit()
         ## show figure with interpolation
-        imgIP = []
-        for line in xpm_data:
-            value_line = []
-            for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-                value_line.append(
-                    float(notes[chars.index(line[i : i + xpm_char_per_pixel])])
-                )
-            imgIP.append(value_line)
-            imgIP = ndimage.gaussian_filter(imgIP,sigma=0.3)
+        imgIP = origin_image(xpm, IP)
         im = plt.imshow(imgIP, cmap="coolwarm", interpolation="bilinear", aspect="auto")
         plt.colorbar(im, fraction=0.046, pad=0.04)
 
@@ -264,45 +535,45 @@ def drawxpm_origin(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None
     x_tick, y_tick = 3, 3
     xpm_xticks = ["{:.1f}".format(x) for x in xpm_xaxis]
     xpm_yticks = ["{:.1f}".format(y) for y in xpm_yaxis]
-    if xpm_width < 100:
-        x_tick = int(xpm_width / 3)
-    elif xpm_width >= 100 and xpm_width < 1000:
-        x_tick = int(xpm_width / 5)
-    elif xpm_width > 500:
-        x_tick = int(xpm_width / 10)
-    if xpm_height < 100:
-        y_tick = int(xpm_height / 3)
-    elif xpm_height >= 100 and xpm_height < 1000:
-        y_tick = int(xpm_height / 5)
-    elif xpm_height > 500:
-        y_tick = int(xpm_height / 10)
-    if xpm_width / xpm_height > 10:
-        y_tick = int(xpm_height / 2)
-    if xpm_height / xpm_width > 10:
-        x_tick = int(xpm_width / 2)
+    if xpm.width < 100:
+        x_tick = int(xpm.width / 3)
+    elif xpm.width >= 100 and xpm.width < 1000:
+        x_tick = int(xpm.width / 5)
+    elif xpm.width > 500:
+        x_tick = int(xpm.width / 10)
+    if xpm.height < 100:
+        y_tick = int(xpm.height / 3)
+    elif xpm.height >= 100 and xpm.height < 1000:
+        y_tick = int(xpm.height / 5)
+    elif xpm.height > 500:
+        y_tick = int(xpm.height / 10)
+    if xpm.width / xpm.height > 10:
+        y_tick = int(xpm.height / 2)
+    if xpm.height / xpm.width > 10:
+        x_tick = int(xpm.width / 2)
     plt.tick_params(axis="both", which="major")
     plt.xticks(
         [0]
-        + [w for w in range(x_tick, xpm_width - int(x_tick / 2), x_tick)]
-        + [xpm_width - 1],
+        + [w for w in range(x_tick, xpm.width - int(x_tick / 2), x_tick)]
+        + [xpm.width - 1],
         [xpm_xticks[0]]
-        + [xpm_xticks[w] for w in range(x_tick, xpm_width - int(x_tick / 2), x_tick)]
+        + [xpm_xticks[w] for w in range(x_tick, xpm.width - int(x_tick / 2), x_tick)]
         + [xpm_xticks[-1]],
     )
     plt.yticks(
         [0]
-        + [h for h in range(y_tick, xpm_height - int(y_tick / 2), y_tick)]
-        + [xpm_height - 1],
+        + [h for h in range(y_tick, xpm.height - int(y_tick / 2), y_tick)]
+        + [xpm.height - 1],
         [xpm_yticks[0]]
-        + [xpm_yticks[h] for h in range(y_tick, xpm_height - int(y_tick / 2), y_tick)]
+        + [xpm_yticks[h] for h in range(y_tick, xpm.height - int(y_tick / 2), y_tick)]
         + [xpm_yticks[-1]],
     )
 
     ## set other infos in the figure
-    plt.title(xpm_title)
-    plt.xlabel(xpm_xlabel)
-    plt.ylabel(xpm_ylabel)
-    print("Legend of this xpm figure -> ", xpm_legend)
+    plt.title(xpm.title)
+    plt.xlabel(xpm.xlabel)
+    plt.ylabel(xpm.ylabel)
+    print("Legend of this xpm figure -> ", xpm.legend)
     output_filename = f"{outputpng}.png"
     if outputpng != None:
         plt.savefig(output_filename, dpi=600)
@@ -310,66 +581,88 @@ def drawxpm_origin(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None
         plt.show()
 
 
-def drawxpm_newIP(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
+def linear_weights(axis: np.ndarray, axis_new: np.ndarray) -> tuple:
+    """indices i and weights w of linear interpolation from ascending axis to axis_new,
+    so that f(axis_new) = f[i] * (1 - w) + f[i + 1] * w
+    """
+
+    i = np.searchsorted(axis, axis_new, side="right") - 1
+    i = np.clip(i, 0, len(axis) - 2)
+    w = (axis_new - axis[i]) / (axis[i + 1] - axis[i])
+    return i, w
+
+
+def interpolate_grid(xaxis: list, yaxis: list, values: np.ndarray, factor: int) -> tuple:
+    """bilinear interpolation of values (len(yaxis), len(xaxis)) onto a grid with
+    factor times more points along both axes, the same as the former
+    interp2d(kind="linear") or RegularGridInterpolator, but done separably:
+    first along x for every row, then along y for every new column
+    return x_new, y_new (ascending) and values (len(y_new), len(x_new))
+    """
+
+    xaxis, yaxis = np.asarray(xaxis, dtype=float), np.asarray(yaxis, dtype=float)
+    values = np.asarray(values, dtype=float)
+    ## sort both axes ascending, the y-axis of xpm is given from top to bottom
+    x_order, y_order = np.argsort(xaxis), np.argsort(yaxis)
+    xaxis, yaxis = xaxis[x_order], yaxis[y_order]
+    values = values[np.ix_(y_order, x_order)]
+
+    x_new = np.linspace(xaxis[0], xaxis[-1], factor * len(xaxis))
+    y_new = np.linspace(yaxis[0], yaxis[-1], factor * len(yaxis))
+    ## f[i] + (f[i + 1] - f[i]) * w, computed in place on the gathered rows/columns
+    if len(xaxis) > 1:
+        i, w = linear_weights(xaxis, x_new)
+        step = np.diff(values, axis=1)[:, i]
+        step *= w
+        values = values[:, i]
+        values += step
+    if len(yaxis) > 1:
+        i, w = linear_weights(yaxis, y_new)
+        step = np.diff(values, axis=0)[i, :]
+        step *= w[:, np.newaxis]
+        values = values[i, :]
+        values += step
+    return x_new, y_new, values
+
+
+def drawxpm_newIP(
+    xpmfile: str, IP: bool, outputpng: str, noshow: bool, ip_factor: int = 10
+) -> None:
     """draw xpm figure by pcolormesh (with interpolation)
-    xpmfile: input xpm file
+    xpmfile: input xpm file, or a XpmMap
     IP : whether to interpolation
     outputpng: the name for figure output
     noshow: whether not to show figure, useful for PC without gui
+    ip_factor: upsampling factor of the interpolation along each axis
     """
 
+    load_plotting()
+
     ## check parameters
-    if not os.path.exists(xpmfile):
+    if isinstance(xpmfile, str) and not os.path.exists(xpmfile):
         print("ERROR -> {} not in current directory".format(xpmfile))
         exit()
     if outputpng != None and os.path.exists(outputpng):
         print("ERROR -> {} already in current directory".format(outputpng))
         exit()
 
-    (
-        xpm_title,
-        xpm_legend,
-        xpm_type,
-        xpm_xlabel,
-        xpm_ylabel,
-        xpm_width,
-        xpm_height,
-        xpm_color_num,
-        xpm_char_per_pixel,
-        chars,
-        colors,
-        notes,
-        colors_rgb,
-        xpm_xaxis,
-        xpm_yaxis,
-        xpm_data,
-    ) = readxpm(xpmfile)
+    xpm = readxpm(xpmfile)
 
-    if xpm_type != "Continuous":
+    if xpm.type != "Continuous":
         print("ERROR -> Only Continuous type xpm file can interpolation")
         exit()
 
-    xpm_yaxis.reverse()
+    xpm_xaxis, xpm_yaxis = xpm.xaxis, xpm.yaxis[::-1]
 
-    ## convert xpm_data to img (values)
-    img = []
-    for line in xpm_data:
-        value_line = []
-        for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-            value_line.append(
-                float(notes[chars.index(line[i : i + xpm_char_per_pixel])])
-            )
-        img.append(value_line)
+    ## img (values) has been decoded by readxpm
+    img = xpm.values
     #img = ndimage.gaussian_filter(img, sigma=0.3)
 
     if IP == False:
         plt.pcolormesh(xpm_xaxis, xpm_yaxis, img, cmap="coolwarm", shading="auto")
     elif IP == True:
         ## interpolation
-        ip_func = interp2d(xpm_xaxis, xpm_yaxis, img, kind="linear")
-        x_new = np.linspace(np.min(xpm_xaxis), np.max(xpm_xaxis), 10 * len(xpm_xaxis))
-        y_new = np.linspace(np.min(xpm_yaxis), np.max(xpm_yaxis), 10 * len(xpm_yaxis))
-        value_new = ip_func(x_new, y_new)
+        x_new, y_new, value_new = interpolate_grid(xpm_xaxis, xpm_yaxis, img, ip_factor)
         img = ndimage.gaussian_filter(value_new, sigma=0.3)
         x_new, y_new = np.meshgrid(x_new, y_new)
         ## show figure
@@ -380,10 +673,10 @@ def drawxpm_newIP(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
     ax.yaxis.set_major_formatter(FormatStrFormatter("%.1f"))
     ax.xaxis.set_major_formatter(FormatStrFormatter("%.1f"))
     plt.colorbar()
-    plt.title(xpm_title)
-    plt.xlabel(xpm_xlabel)
-    plt.ylabel(xpm_ylabel)
-    print("Legend of this xpm figure -> ", xpm_legend)
+    plt.title(xpm.title)
+    plt.xlabel(xpm.xlabel)
+    plt.ylabel(xpm.ylabel)
+    print("Legend of this xpm figure -> ", xpm.legend)
     output_filename = f"{outputpng}_2D.png"
     if outputpng != None:
         plt.savefig(output_filename, dpi=600)
@@ -391,76 +684,19 @@ def drawxpm_newIP(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
         plt.show()
 
 
-def drawxpm_3D(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
-    """draw xpm 3D figure (with interpolation)
-    xpmfile: input xpm file
-    IP : whether to interpolation
-    outputpng: the name for figure output
-    noshow: whether not to show figure, useful for PC without gui
+def build_3d_figure(surface: dict) -> tuple:
+    """build the 3D figure of drawxpm_3D from the arrays in surface
+    surface: x, y (1D axes), z (smoothed values), offset (z of the contour plane),
+             title, xlabel, ylabel
     """
 
-    ## check parameters
-    if not os.path.exists(xpmfile):
-        print("ERROR -> {} not in current directory".format(xpmfile))
-        exit()
-    if outputpng != None and os.path.exists(outputpng):
-        print("ERROR -> {} already in current directory".format(outputpng))
-        exit()
+    load_plotting()
 
-    (
-        xpm_title,
-        xpm_legend,
-        xpm_type,
-        xpm_xlabel,
-        xpm_ylabel,
-        xpm_width,
-        xpm_height,
-        xpm_color_num,
-        xpm_char_per_pixel,
-        chars,
-        colors,
-        notes,
-        colors_rgb,
-        xpm_xaxis,
-        xpm_yaxis,
-        xpm_data,
-    ) = readxpm(xpmfile)
-
-    if xpm_type != "Continuous":
-        print("ERROR -> Only Continuous type xpm file can draw 3D figure")
-        exit()
-
-    xpm_yaxis.reverse()
-
-    ## convert xpm_data to values
-    values = []
-    for line in xpm_data:
-        for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-            values.append(float(notes[chars.index(line[i : i + xpm_char_per_pixel])]))
-    xpm_xaxis = np.array(xpm_xaxis)
-    xpm_yaxis = np.array(xpm_yaxis)
-    img = np.array(values)
-
-    ## draw 3d figure
+    x_new, y_new = np.meshgrid(surface["x"], surface["y"])
+    img_smooth = surface["z"]
     fig = plt.figure()
     ax = fig.add_subplot(projection='3d')
 
-    ## interpolation
-    IP_value = 1
-    if IP == False:
-        IP_value = 1
-    elif IP == True:
-        IP_value = 12
-    img = img.reshape(len(xpm_xaxis), len(xpm_yaxis))
-    ip_func = interp2d(xpm_xaxis, xpm_yaxis, img, kind="linear")
-    x_new = np.linspace(np.min(xpm_xaxis), np.max(xpm_xaxis), IP_value * len(xpm_xaxis))
-    y_new = np.linspace(np.min(xpm_yaxis), np.max(xpm_yaxis), IP_value * len(xpm_yaxis))
-    img_new = ip_func(x_new, y_new)
-    x_new, y_new = np.meshgrid(x_new, y_new)
-    img_new = img_new.reshape(len(x_new), len(y_new))
-    # Smooth the data using a Gaussian filter
-    img_smooth = gaussian_filter(img_new,sigma=0.3)
-
     ## show figure
     surf = ax.plot_surface(
         x_new,
@@ -477,80 +713,223 @@ def drawxpm_3D(xpmfile: str, IP: bool, outputpng: str, noshow: bool) -> None:
         y_new,
         img_smooth,
         zdir="z",
-        offset=math.floor(min(values)) - math.floor(max(values) - min(values)) / 30,
+        offset=surface["offset"],
         cmap="coolwarm",
     )
-    plt.title(xpm_title)
-    plt.xlabel(xpm_xlabel)
-    plt.ylabel(xpm_ylabel)
+    plt.title(surface["title"])
+    plt.xlabel(surface["xlabel"])
+    plt.ylabel(surface["ylabel"])
     plt.colorbar(surf, shrink=0.6, aspect=12)
     ## set the axis ticks and other figure infos
     ax.zaxis.set_major_locator(AutoLocator())
     ax.zaxis.set_major_formatter(FormatStrFormatter("%.1f"))
     ax.yaxis.set_major_formatter(FormatStrFormatter("%.1f"))
     ax.xaxis.set_major_formatter(FormatStrFormatter("%.1f"))
-    for i in range(9):
-        output_filename= f"{outputpng}_3D_R{i}.png" 
-        ax.view_init(elev=30, azim=45*i)
-        print("Legend of this xpm figure -> ", xpm_legend)
-
-        if outputpng != None:
-            plt.savefig(output_filename, dpi=600)
-        if noshow == False:
-            plt.show()
+    return fig, ax
+
+
+def save_3d_views(surface: dict, views: list, dpi: int) -> None:
+    """build the 3D figure once and save it for every (azimuth, filename) in views"""
+
+    fig, ax = build_3d_figure(surface)
+    for azim, output_filename in views:
+        ax.view_init(elev=30, azim=azim)
+        fig.savefig(output_filename, dpi=dpi)
+    plt.close(fig)
+
+
+## the surface of drawxpm_3D, sent once to every worker process
+_worker_surface = None
+
+
+def _init_3d_worker(surface: dict) -> None:
+    global _worker_surface
+    _worker_surface = surface
+
+
+def _save_3d_views_worker(views: list, dpi: int) -> None:
+    save_3d_views(_worker_surface, views, dpi)
+
+
+def assemble_rotations(pngfiles: list, outputfile: str, rotation_output: str, fps: int = 4) -> None:
+    """combine the rotation pngs into one animated gif / mp4, or one contact sheet png"""
+
+    if rotation_output == "mp4":
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg == None:
+            print("ERROR -> ffmpeg is needed to write mp4, use --rotation-output gif or sheet")
+            exit()
+        pattern = os.path.join(os.path.dirname(pngfiles[0]), "R%d.png")
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-framerate", str(fps), "-i", pattern,
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", outputfile],
+            check=True,
+        )
+        return
+
+    try:
+        from PIL import Image
+    except ImportError:
+        print("ERROR -> pillow is needed to write gif or contact sheet")
+        exit()
+    frames = [Image.open(pngfile).convert("RGB") for pngfile in pngfiles]
+    if rotation_output == "gif":
+        frames[0].save(
+            outputfile, save_all=True, append_images=frames[1:], duration=int(1000 / fps), loop=0
+        )
+    elif rotation_output == "sheet":
+        ncol = math.ceil(math.sqrt(len(frames)))
+        nrow = math.ceil(len(frames) / ncol)
+        width, height = frames[0].size
+        sheet = Image.new("RGB", (ncol * width, nrow * height), "white")
+        for i, frame in enumerate(frames):
+            sheet.paste(frame, ((i % ncol) * width, (i // ncol) * height))
+        sheet.save(outputfile)
+
+
+def drawxpm_3D(
+    xpmfile: str,
+    IP: bool,
+    outputpng: str,
+    noshow: bool,
+    ip_factor: int = 12,
+    rotations: int = 9,
+    dpi: int = 600,
+    nproc: int = 1,
+    rotation_output: str = "png",
+) -> None:
+    """draw xpm 3D figure (with interpolation)
+    xpmfile: input xpm file, or a XpmMap
+    IP : whether to interpolation
+    outputpng: the name for figure output
+    noshow: whether not to show figure, useful for PC without gui
+    ip_factor: upsampling factor of the interpolation along each axis
+    rotations: number of views, turning the azimuth from 0 to 360 degrees
+    dpi: resolution of each view
+    nproc: number of processes rendering the views, each builds the figure once
+    rotation_output: png (one file per view), gif, mp4 or sheet (all views in one png)
+    """
+
+    load_plotting()
+
+    ## check parameters
+    if isinstance(xpmfile, str) and not os.path.exists(xpmfile):
+        print("ERROR -> {} not in current directory".format(xpmfile))
+        exit()
+    if outputpng != None and os.path.exists(outputpng):
+        print("ERROR -> {} already in current directory".format(outputpng))
+        exit()
+
+    xpm = readxpm(xpmfile)
+
+    if xpm.type != "Continuous":
+        print("ERROR -> Only Continuous type xpm file can draw 3D figure")
+        exit()
+
+    xpm_xaxis, xpm_yaxis = xpm.xaxis, xpm.yaxis[::-1]
+
+    ## values have been decoded by readxpm
+    values = xpm.values.ravel()
+    img = xpm.values
+
+    ## interpolation
+    IP_value = 1
+    if IP == False:
+        IP_value = 1
+    elif IP == True:
+        IP_value = ip_factor
+    x_new, y_new, img_new = interpolate_grid(xpm_xaxis, xpm_yaxis, img, IP_value)
+    # Smooth the data using a Gaussian filter
+    img_smooth = gaussian_filter(img_new,sigma=0.3)
+    surface = {
+        "x": x_new,
+        "y": y_new,
+        "z": img_smooth,
+        "offset": math.floor(values.min()) - math.floor(values.max() - values.min()) / 30,
+        "title": xpm.title,
+        "xlabel": xpm.xlabel,
+        "ylabel": xpm.ylabel,
+    }
+    print("Legend of this xpm figure -> ", xpm.legend)
+
+    if outputpng != None:
+        ## 9 rotations give the former views at azimuth 0, 45, ..., 360
+        step = 360.0 / (rotations - 1) if rotations > 1 else 0.0
+        with tempfile.TemporaryDirectory() as tmpdir:
+            if rotation_output == "png":
+                views = [(step * i, f"{outputpng}_3D_R{i}.png") for i in range(rotations)]
+            else:
+                views = [(step * i, os.path.join(tmpdir, f"R{i}.png")) for i in range(rotations)]
+
+            if nproc > 1 and rotations > 1:
+                ## deal the views round-robin, so each worker builds the figure only once
+                with ProcessPoolExecutor(
+                    max_workers=nproc, initializer=_init_3d_worker, initargs=(surface,)
+                ) as executor:
+                    jobs = [
+                        executor.submit(_save_3d_views_worker, views[i::nproc], dpi)
+                        for i in range(min(nproc, rotations))
+                    ]
+                    for job in jobs:
+                        job.result()
+            else:
+                save_3d_views(surface, views, dpi)
+
+            if rotation_output != "png":
+                suffix = "_sheet.png" if rotation_output == "sheet" else "." + rotation_output
+                output_filename = f"{outputpng}_3D{suffix}"
+                assemble_rotations([view[1] for view in views], output_filename, rotation_output)
+                print("Info -> {} views are saved into {}".format(rotations, output_filename))
+
+    if noshow == False:
+        build_3d_figure(surface)
+        plt.show()
     plt.close()
 
 
-def get_scatter_data(xpm_infos: tuple) -> tuple:
-    """convert xpm_infos into scatter data
-    xpm_infos: the return of readxpm()
+def grid_points(xpm: "XpmMap") -> tuple:
+    """flatten xpm into x, y, v of every pixel (row by row, from the top row of xpm)
+    xpm: the return of readxpm()
     """
-    (
-        xpm_title,
-        xpm_legend,
-        xpm_type,
-        xpm_xlabel,
-        xpm_ylabel,
-        xpm_width,
-        xpm_height,
-        xpm_color_num,
-        xpm_char_per_pixel,
-        chars,
-        colors,
-        notes,
-        colors_rgb,
-        xpm_xaxis,
-        xpm_yaxis,
-        xpm_data,
-    ) = xpm_infos
 
-    xpm_yaxis.reverse()
+    xpm_xaxis, xpm_yaxis = xpm.xaxis, xpm.yaxis[::-1]
+    v = xpm.values.ravel()
+    x = np.tile(np.array(xpm_xaxis, dtype=float), xpm.height)
+    y = np.repeat(np.array(xpm_yaxis, dtype=float), xpm.width)
+    return x, y, v
+
+
+def get_scatter_data(xpm: "XpmMap") -> tuple:
+    """convert xpm into scatter data
+    xpm: the return of readxpm()
+    """
 
-    ## parse xpm_data into x, y, v
-    x, y, v = [], [], []
-    scatter_x, scatter_y = [], []
-    # print(len(xpm_xaxis))
-    # print(len(xpm_yaxis))
-    for l in range(len(xpm_data)):
-        for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-            v.append(float(notes[chars.index(xpm_data[l][i : i + xpm_char_per_pixel])]))
-            x.append(xpm_xaxis[int(i / xpm_char_per_pixel)])
-            y.append(xpm_yaxis[l])
+    ## parse decoded values into x, y, v
+    x, y, v = grid_points(xpm)
 
     ## parse x, y, v into scatter_x, scatter_y
-    v_max = max(v)
+    v_max = v.max()
     scatter_weight = 1
-    for i in range(len(v)):
-        count = round((v_max - v[i]) * scatter_weight)
-        for _ in range(count):
-            scatter_x.append(x[i])
-            scatter_y.append(y[i])
+    count = np.rint((v_max - v) * scatter_weight).astype(np.int64)
+    scatter_x = np.repeat(x, count)
+    scatter_y = np.repeat(y, count)
 
     return scatter_x, scatter_y, x, y, v
 
 
+def write_rows(fo, data: np.ndarray, row_format: str, chunk_rows: int = 65536) -> None:
+    """write a 2D array into an opened text file, one formatted chunk at a time
+    row_format: %-style format of one row, ended with a newline, e.g. "%.6f,%.6f\\n"
+    """
+
+    ## one % on a preformatted buffer per chunk, instead of one format call per row
+    for start in range(0, len(data), chunk_rows):
+        chunk = data[start : start + chunk_rows]
+        fo.write((row_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
 def extract_scatter(xpm: str, outcsv: str = None) -> None:
-    """extract data from xpm and save to csv"""
+    """extract data from xpm and save to csv (or to a (n, 3) x, y, value array in .npy)"""
 
     if not os.path.exists(xpm):
         print("ERROR -> {} not in current directory".format(xpm))
@@ -560,58 +939,104 @@ def extract_scatter(xpm: str, outcsv: str = None) -> None:
         exit()
     if outcsv == None:
         outcsv = xpm[:-4] + ".csv"
-    if outcsv[-4:] != ".csv":
-        print("ERROR -> specify a output file with suffix csv")
+    if outcsv[-4:] not in [".csv", ".npy"]:
+        print("ERROR -> specify a output file with suffix csv or npy")
         exit()
     if os.path.exists(outcsv):
         print("ERROR -> {} already in current directory".format(outcsv))
         exit()
 
-    xpm_infos = readxpm(xpm)
-    if xpm_infos[2] != "Continuous":
+    xpm_map = readxpm(xpm)
+    if xpm_map.type != "Continuous":
         print("ERROR -> can not extract data from xpm whose type is not Continuous")
         exit()
 
-    ## only x, y, v values are needed
-    _, _, x, y, v = get_scatter_data(xpm_infos)
-    if len(x) != len(y) != len(v):
-        print("ERROR -> wrong in length of x, y, v")
-        exit()
+    ## only x, y, v values are needed, no scatter points
+    data = np.column_stack(grid_points(xpm_map))
     ## write results
-    with open(outcsv, "w") as fo:
-        fo.write("{},{},{}\n".format("x-axis", "y-axis", "value"))
-        for i in range(len(x)):
-            fo.write("{:.6f},{:.6f},{:.6f}\n".format(x[i], y[i], v[i]))
+    if outcsv[-4:] == ".npy":
+        np.save(outcsv, data)
+    else:
+        with open(outcsv, "w") as fo:
+            fo.write("{},{},{}\n".format("x-axis", "y-axis", "value"))
+            write_rows(fo, data, "%.6f,%.6f,%.6f\n")
     print("Info -> extract data from {} successfully".format(xpm))
     print("Info -> data are saved into {}".format(outcsv))
 
 
-def combinexpm(xpm_file_list: list, outputpng: str, noshow: bool) -> None:
-    """combine xpm by scatters
+def get_population_weights(
+    xpm: "XpmMap", weighting: str = "counts", temperature: float = 310.0
+) -> tuple:
+    """convert xpm into x, y and the population weight of each point
+    xpm: the return of readxpm()
+    weighting: counts, the number of points get_scatter_data() repeats (round(v_max - v));
+               boltzmann, exp(-v / kT) normalized over the map, for v in kJ/mol
+    temperature: temperature (K) of the boltzmann weighting
+    """
+
+    x, y, v = grid_points(xpm)
+    if weighting == "boltzmann":
+        kT = 0.0083144626 * temperature
+        weights = np.exp(-(v - np.nanmin(v)) / kT)
+        weights = np.nan_to_num(weights, nan=0.0)
+        weights /= weights.sum()
+    else:
+        weights = np.rint(v.max() - v)
+    return x, y, weights
+
+
+def combinexpm(
+    xpm_file_list: list,
+    outputpng: str,
+    noshow: bool,
+    npz_cache: bool = False,
+    weighting: str = "counts",
+    temperature: float = 310.0,
+    bins: int = 800,
+) -> None:
+    """combine xpm by summing the population of every grid point into one histogram
     xpm_file_list : a list contains all xpm file names
     outputpng : the name for figure output
     noshow: whether not to show figure, useful for PC without gui
+    npz_cache: whether to keep decoded xpm in a .npz file next to each xpm
+    weighting: counts or boltzmann, see get_population_weights()
+    temperature: temperature (K) of the boltzmann weighting
+    bins: number of histogram bins along each axis
     """
 
-    x_list, y_list = [], []
-    xpm_title, xpm_legend, xpm_xlabel, xpm_ylabel = "", "", "", ""
+    load_plotting()
+
+    ## decode and weight every map once, outside the process cache, so only one grid
+    ## is held at a time; the populated points (w > 0) of each map are kept
+    xmin, xmax, ymin, ymax = np.inf, -np.inf, np.inf, -np.inf
+    populated = []
     for file in xpm_file_list:
-        xpm_infos = readxpm(file)
-        xpm_title = xpm_infos[0]
-        xpm_legend = xpm_infos[1]
-        xpm_xlabel = xpm_infos[3]
-        xpm_ylabel = xpm_infos[4]
-        if xpm_infos[2] != "Continuous":
+        xpm = readxpm(file, npz_cache=npz_cache, process_cache=False)
+        if xpm.type != "Continuous":
             print("ERROR -> can not combine xpm whose type is not Continuous")
             exit()
-        x, y, _, _, _ = get_scatter_data(xpm_infos)
-        x_list += x
-        y_list += y
+        x, y, w = get_population_weights(xpm, weighting, temperature)
+        keep = w > 0
+        x, y, w = x[keep], y[keep], w[keep]
+        if len(x) == 0:
+            continue
+        xmin, xmax = min(xmin, x.min()), max(xmax, x.max())
+        ymin, ymax = min(ymin, y.min()), max(ymax, y.max())
+        populated.append((x, y, w))
+    if xmin > xmax:
+        print("ERROR -> no populated point in the xpm files to combine")
+        exit()
+
+    ## accumulate the weighted histograms over the range of all populated points
+    heatmap = np.zeros((bins, bins))
+    for x, y, w in populated:
+        hist, xedges, yedges = np.histogram2d(
+            x, y, bins=bins, range=[[xmin, xmax], [ymin, ymax]], weights=w
+        )
+        heatmap += hist
+    del populated
 
     ## combine xpm
-    # plt.scatter(x_list, y_list)
-    # plt.show()
-    heatmap, xedges, yedges = np.histogram2d(x_list, y_list, bins=800)
     heatmap = gaussian_filter(heatmap, sigma=0.3)
     extent = [xedges[0], xedges[-1], yedges[0], yedges[-1]]
     plt.imshow(heatmap.T, origin="lower", extent=extent, cmap="coolwarm")
@@ -622,10 +1047,10 @@ def combinexpm(xpm_file_list: list, outputpng: str, noshow: bool) -> None:
     ax = plt.gca()
     ax.yaxis.set_major_formatter(FormatStrFormatter("%.1f"))
     ax.xaxis.set_major_formatter(FormatStrFormatter("%.1f"))
-    plt.title(xpm_title)
-    plt.xlabel(xpm_xlabel)
-    plt.ylabel(xpm_ylabel)
-    print("Legend of this xpm figure -> ", xpm_legend)
+    plt.title(xpm.title)
+    plt.xlabel(xpm.xlabel)
+    plt.ylabel(xpm.ylabel)
+    print("Legend of this xpm figure -> ", xpm.legend)
     output_filename = f"{outputpng}.png"
     if outputpng != None and os.path.exists(outputpng):
         print("ERROR -> {} already in current directory".format(outputpng))
@@ -636,9 +1061,11 @@ def combinexpm(xpm_file_list: list, outputpng: str, noshow: bool) -> None:
         plt.show()
 
 
-def xpm2gpl(xpm: str, outgpl: str = None) -> None:
+def xpm2gpl(xpm: str, outgpl: str = None, binary: bool = False) -> None:
     """convert xpm file to gnuplot scripts
     xpmfile: a list contains xpm file names
+    binary: write the map into a gnuplot binary matrix file (.bin) next to the script,
+            instead of inline data, useful for maps with millions of pixels
     """
 
     ## check files
@@ -654,88 +1081,182 @@ def xpm2gpl(xpm: str, outgpl: str = None) -> None:
         print("ERROR -> {} already in current directory".format(outgpl))
         exit()
     outpng = xpm[:-4] + ".png"
+    outbin = os.path.splitext(outgpl)[0] + ".bin"
+    if binary == True and os.path.exists(outbin):
+        print("ERROR -> {} already in current directory".format(outbin))
+        exit()
 
     ## read xpm files
-    (
-        xpm_title,
-        xpm_legend,
-        xpm_type,
-        xpm_xlabel,
-        xpm_ylabel,
-        xpm_width,
-        xpm_height,
-        xpm_color_num,
-        xpm_char_per_pixel,
-        chars,
-        colors,
-        notes,
-        colors_rgb,
-        xpm_xaxis,
-        xpm_yaxis,
-        xpm_data,
-    ) = readxpm(xpm)
+    xpm_map = readxpm(xpm)
 
-    xpm_yaxis.reverse()
+    xpm_xaxis, xpm_yaxis = xpm_map.xaxis, xpm_map.yaxis[::-1]
 
-    ## write gnuplot scripts
-    gpl_lines = "set term png\n"
-    gpl_lines += """set output "{}" \n""".format(outpng)
-    gpl_lines += "unset colorbox\n"
+    ## head of gnuplot scripts
+    gpl_head = "set term png\n"
+    gpl_head += """set output "{}" \n""".format(outpng)
+    gpl_head += "unset colorbox\n"
     pal_line = "set pal defined("
-    for index, color in enumerate(colors):
-        pal_line += """{} "{}",""".format(index, color)
-    pal_line = pal_line.strip(",") + ")"
-    gpl_lines += pal_line + "\n\n"
-    ## add data lines
-    gpl_lines += "$data << EOD\n"
-    for l in range(len(xpm_data)):
-        for i in range(0, xpm_width * xpm_char_per_pixel, xpm_char_per_pixel):
-            value = chars.index(xpm_data[l][i : i + xpm_char_per_pixel])
-            gpl_lines += "{:.6f} {:.6f} {:.6f}\n".format(
-                xpm_xaxis[int(i / xpm_char_per_pixel)], xpm_yaxis[l], value
-            )
-    gpl_lines += "EOD\n\n"
-    ## add tail part of gpl file
-    gpl_lines += "#set tmargin at screen 0.95\n"
-    gpl_lines += "#set bmargin at screen 0.20\n"
-    gpl_lines += "#set rmargin at screen 0.85\n"
+    pal_line += ",".join(
+        '{} "{}"'.format(index, color) for index, color in enumerate(xpm_map.colors)
+    )
+    pal_line += ")"
+    gpl_head += pal_line + "\n\n"
+
+    ## tail part of gpl file
+    gpl_tail = ["#set tmargin at screen 0.95\n"]
+    gpl_tail.append("#set bmargin at screen 0.20\n")
+    gpl_tail.append("#set rmargin at screen 0.85\n")
     y_posi = 0.92
-    for index, note in enumerate(notes):
+    for index, note in enumerate(xpm_map.notes):
         label_line = """#set label "{:10}" at screen 0.85,{:.2f} left textcolor rgb "{}"\n""".format(
-            note, y_posi, colors[index]
+            note, y_posi, xpm_map.colors[index]
         )
         y_posi -= 0.10
-        gpl_lines += label_line
-    gpl_lines += """set term pngcairo enhanced truecolor font "Arial,85" fontscale 1 linewidth 20 pointscale 5 size 10000,6000\n"""
-    gpl_lines += "set tics out nomirror;\n"
-    gpl_lines += "set key out reverse Left spacing 2 samplen 1/2\n"
-    gpl_lines += """set title "{}"\n""".format(xpm_title)
-    gpl_lines += """set xlabel "{}"; set ylabel "{}";\n""".format(
-        xpm_xlabel, xpm_ylabel
-    )
-    gpl_lines += """plot [{:.2f}:{:.2f}] [{:.2f}:{:.2f}] $data u 1:2:3 w imag notit, \\\n""".format(
+        gpl_tail.append(label_line)
+    gpl_tail.append("""set term pngcairo enhanced truecolor font "Arial,85" fontscale 1 linewidth 20 pointscale 5 size 10000,6000\n""")
+    gpl_tail.append("set tics out nomirror;\n")
+    gpl_tail.append("set key out reverse Left spacing 2 samplen 1/2\n")
+    gpl_tail.append("""set title "{}"\n""".format(xpm_map.title))
+    gpl_tail.append("""set xlabel "{}"; set ylabel "{}";\n""".format(
+        xpm_map.xlabel, xpm_map.ylabel
+    ))
+    data_source = "$data" if binary == False else """"{}" binary matrix""".format(os.path.basename(outbin))
+    gpl_tail.append("""plot [{:.2f}:{:.2f}] [{:.2f}:{:.2f}] {} u 1:2:3 w imag notit, \\\n""".format(
         math.floor(min(xpm_xaxis) * 10.0) / 10.0 - 0.1,
         math.ceil(max(xpm_xaxis) * 10.0) / 10.0 + 0.1,
         math.floor(min(xpm_yaxis) * 10.0) / 10.0 - 0.1,
         math.ceil(max(xpm_yaxis) * 10.0) / 10.0 + 0.1,
-    )
-    for index, note in enumerate(notes):
-        gpl_lines += """{} w p ps 3 pt 5 lc rgb "{}" t"{}", \\\n""".format(
-            math.floor(min(xpm_yaxis)) - 1, colors[index], note
-        )
-    gpl_lines = gpl_lines.strip("\n").strip("\\").strip().strip(",")
-
-    ## write gpl files
+        data_source,
+    ))
+    for index, note in enumerate(xpm_map.notes):
+        gpl_tail.append("""{} w p ps 3 pt 5 lc rgb "{}" t"{}", \\\n""".format(
+            math.floor(min(xpm_yaxis)) - 1, xpm_map.colors[index], note
+        ))
+    gpl_tail = "".join(gpl_tail).strip("\n").strip("\\").strip().strip(",")
+
+    ## write gpl files, data lines are streamed in chunks
     with open(outgpl, "w") as fo:
-        fo.write(gpl_lines + "\n")
+        fo.write(gpl_head)
+        if binary == False:
+            fo.write("$data << EOD\n")
+            x, y, _ = grid_points(xpm_map)
+            write_rows(fo, np.column_stack((x, y, xpm_map.index.ravel())), "%.6f %.6f %.6f\n")
+            fo.write("EOD\n\n")
+        fo.write(gpl_tail + "\n")
+
+    ## gnuplot binary matrix: first row is <width> x..., then <y> z... for each row
+    if binary == True:
+        matrix = np.empty((xpm_map.height + 1, xpm_map.width + 1), dtype=np.float32)
+        matrix[0, 0] = xpm_map.width
+        matrix[0, 1:] = xpm_xaxis
+        matrix[1:, 0] = xpm_yaxis
+        matrix[1:, 1:] = xpm_map.index
+        matrix.tofile(outbin)
+        print("Info -> map data are saved into {}".format(outbin))
 
     print("Info -> write gnuplot scripts {} from {} successfully".format(outgpl, xpm))
 
 
+def plot_xpm(inputxpm: str, output: str, options: dict) -> None:
+    """draw the figures of one xpm file into the folder {output}_FEL
+    inputxpm: input xpm file, or a XpmMap
+    output: prefix of the figures, None to only show them
+    options: ip, ip_factor (None for the default of each figure), pcm, fig_3d, noshow,
+             and rotations, dpi, nproc, rotation_output of drawxpm_3D
+    """
+
+    outputpng = None
+    if output != None:
+        outdir = f"{output}_FEL"
+        os.makedirs(outdir, exist_ok=True)
+        outputpng = os.path.join(outdir, os.path.basename(output))
+
+    ip, noshow = options["ip"], options["noshow"]
+    ## keep the default factor of each figure unless -ipf is given
+    ip_factor = {} if options["ip_factor"] == None else {"ip_factor": options["ip_factor"]}
+    if options["fig_3d"] == True:
+        drawxpm_3D(
+            inputxpm, ip, outputpng, noshow, **ip_factor,
+            rotations=options["rotations"], dpi=options["dpi"],
+            nproc=options["nproc"], rotation_output=options["rotation_output"],
+        )
+    if options["pcm"] == True:
+        drawxpm_newIP(inputxpm, ip, outputpng, noshow, **ip_factor)
+    elif options["pcm"] == False and options["fig_3d"] == False:
+        drawxpm_origin(inputxpm, ip, outputpng, noshow)
+
+
+def _plot_xpm_worker(inputxpm: str, output: str, options: dict) -> tuple:
+    ## the draw functions exit() on bad input, report it instead of killing the pool
+    try:
+        plot_xpm(inputxpm, output, options)
+    except SystemExit:
+        return inputxpm, False
+    finally:
+        if plt != None:
+            plt.close("all")
+    return inputxpm, True
+
+
+def expand_batch(patterns: list) -> list:
+    """expand the xpm files and glob patterns given to --batch, in order and without duplicates"""
+
+    xpm_files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if len(matches) == 0:
+            print("Warning -> no xpm file matches {}".format(pattern))
+        for xpmfile in matches:
+            if xpmfile not in xpm_files:
+                xpm_files.append(xpmfile)
+    return xpm_files
+
+
+def batch_plot(xpm_files: list, outputdir: str, options: dict, nproc: int) -> None:
+    """draw every xpm file into its own folder {outputdir}/{name}_FEL, nproc files at a time
+    xpm_files: xpm files to draw
+    outputdir: parent folder of the per-file folders, None for current directory
+    options: see plot_xpm(), noshow is forced
+    nproc: number of processes drawing the files
+    """
+
+    jobs = []
+    for xpmfile in xpm_files:
+        name = os.path.splitext(os.path.basename(xpmfile))[0]
+        output = name if outputdir == None else os.path.join(outputdir, name)
+        if output in [job[1] for job in jobs]:
+            print("ERROR -> more than one xpm file named {}, draw them separately".format(name))
+            exit()
+        jobs.append((xpmfile, output))
+    if outputdir != None:
+        os.makedirs(outputdir, exist_ok=True)
+
+    options = dict(options, noshow=True)
+    if nproc > 1 and len(jobs) > 1:
+        ## the files are spread over the pool, each file renders its 3D views serially
+        options["nproc"] = 1
+        with ProcessPoolExecutor(max_workers=min(nproc, len(jobs))) as executor:
+            futures = [executor.submit(_plot_xpm_worker, xpmfile, output, options) for xpmfile, output in jobs]
+            results = [future.result() for future in futures]
+    else:
+        results = [_plot_xpm_worker(xpmfile, output, options) for xpmfile, output in jobs]
+
+    failed = [xpmfile for xpmfile, succeed in results if succeed == False]
+    print("Info -> {} of {} xpm files are drawn".format(len(results) - len(failed), len(results)))
+    if len(failed) > 0:
+        print("Warning -> failed to draw {}".format(", ".join(failed)))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Process xpm files generated by GMX")
     parser.add_argument("-f", "--inputfile", help="input your xpm file")
     parser.add_argument("-o", "--outputfile", help="file name to output")
+    parser.add_argument(
+        "-b",
+        "--batch",
+        nargs="+",
+        help="xpm files or glob patterns to draw in one run, each into its own {name}_FEL folder (under -o if given)",
+    )
     parser.add_argument(
         "-ip",
         "--interpolation",
@@ -743,6 +1264,39 @@ def main():
         default=True,
         help="whether to apply interpolation (only support Continuous type xpm)",
     )
+    parser.add_argument(
+        "-ipf",
+        "--ip-factor",
+        type=int,
+        default=None,
+        help="upsampling factor of the interpolation (default: 10 for pcolormesh, 12 for 3D)",
+    )
+    parser.add_argument(
+        "-rot",
+        "--rotations",
+        type=int,
+        default=9,
+        help="number of 3D views, turning the azimuth from 0 to 360 degrees (default: 9)",
+    )
+    parser.add_argument(
+        "--rotation-dpi",
+        type=int,
+        default=600,
+        help="resolution of the 3D views (default: 600)",
+    )
+    parser.add_argument(
+        "--rotation-output",
+        choices=["png", "gif", "mp4", "sheet"],
+        default="png",
+        help="write the 3D views as one png each, an animated gif / mp4, or one contact sheet png",
+    )
+    parser.add_argument(
+        "-np",
+        "--nproc",
+        type=int,
+        default=1,
+        help="number of processes rendering the 3D views, or the files of --batch (default: 1)",
+    )
     parser.add_argument(
         "-pcm",
         "--pcolormesh",
@@ -770,16 +1324,41 @@ def main():
         nargs="+",
         help="specify some xpm files to combine into one figure",
     )
+    parser.add_argument(
+        "--combine-weight",
+        choices=["counts", "boltzmann"],
+        default="counts",
+        help="population of each point for -c: round(max - value), or exp(-value / kT) (default: counts)",
+    )
+    parser.add_argument(
+        "-t",
+        "--temperature",
+        type=float,
+        default=310.0,
+        help="temperature (K) of the boltzmann weighting (default: 310)",
+    )
+    parser.add_argument(
+        "--npz-cache",
+        action="store_true",
+        default=False,
+        help="keep decoded xpm in a .npz file next to each xpm and reuse it (for -c with many files)",
+    )
     parser.add_argument(
         "-e",
         "--extract",
-        help="specify xpm files to extract scatter data and save to csv file",
+        help="specify xpm files to extract scatter data and save to csv file (or .npy with -o)",
     )
     parser.add_argument(
         "-g",
         "--gnuplot",
         help="specify xpm files to convert into gnuplot scripts (.gpl file)",
     )
+    parser.add_argument(
+        "--gnuplot-binary",
+        action="store_true",
+        default=False,
+        help="with -g, write the map into a gnuplot binary matrix file (.bin) instead of inline data",
+    )
     args = parser.parse_args()
 
     inputxpm = args.inputfile
@@ -793,29 +1372,53 @@ def main():
     fig_3d = args.threeDimensions
 
     ## check parameters and call different functions
-    if inputxpm != None and xpms2combine != None:
-        print("ERROR -> do not specify -f and -c at once ")
+    if args.ip_factor != None and args.ip_factor < 1:
+        print("ERROR -> the interpolation factor should be a positive integer")
+        exit()
+    if args.rotations < 1 or args.rotation_dpi < 1 or args.nproc < 1:
+        print("ERROR -> rotations, rotation dpi and nproc should be positive integers")
+        exit()
+    if [inputxpm, xpms2combine, args.batch].count(None) < 2:
+        print("ERROR -> specify only one of -f, -c and -b at once ")
         exit()
 
+    options = {
+        "ip": ip,
+        "ip_factor": args.ip_factor,
+        "pcm": pcm,
+        "fig_3d": fig_3d,
+        "noshow": noshow,
+        "rotations": args.rotations,
+        "dpi": args.rotation_dpi,
+        "nproc": args.nproc,
+        "rotation_output": args.rotation_output,
+    }
+
     if xpms2combine != None:
-        combinexpm(xpms2combine, output, noshow)
+        outputpng = None
+        if output != None:
+            os.makedirs(f"{output}_FEL", exist_ok=True)
+            outputpng = os.path.join(f"{output}_FEL", os.path.basename(output))
+        combinexpm(
+            xpms2combine, outputpng, noshow, args.npz_cache,
+            weighting=args.combine_weight, temperature=args.temperature,
+        )
 
     if inputxpm != None:
-        if fig_3d == True:
-            drawxpm_3D(inputxpm, ip, output, noshow)
-        if pcm == True:
-            drawxpm_newIP(inputxpm, ip, output, noshow)
-        elif pcm == False and fig_3d == False:
-            drawxpm_origin(inputxpm, ip, output, noshow)
+        plot_xpm(inputxpm, output, options)
+
+    if args.batch != None:
+        xpm_files = expand_batch(args.batch)
+        if len(xpm_files) == 0:
+            print("ERROR -> no xpm file to draw")
+            exit()
+        batch_plot(xpm_files, output, options, args.nproc)
 
     if extract_file != None:
         extract_scatter(extract_file, output)
 
     if gnuplot_file != None:
-        xpm2gpl(gnuplot_file, output)
-    dirname = f"{output}_FEL"
-    os.mkdir(dirname)
-    os.system(f"mv *png {dirname}")
+        xpm2gpl(gnuplot_file, output, args.gnuplot_binary)
     print("Good Day !")
 
 